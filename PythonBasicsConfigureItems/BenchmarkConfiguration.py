@@ -0,0 +1,97 @@
+# QServer introduction to Python: Benchmark the ConfigurationClient against the serial configuration of the examples.
+# A QServerStandIn with a rack of ICS425 Modules is started locally, with latency added to every request to mimic a network.
+# Both approaches perform the same work as the ConfigureICS42 example, for every Module and Channel in the rack.
+#
+# Usage: python BenchmarkConfiguration.py [--modules N] [--latency SECONDS] [--workers N]
+
+import argparse
+import os
+import sys
+import time
+import requests
+from ConfigurationClient import ConfigurationClient
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PythonBasicsLocalServer"))
+from QServerStandIn import QServerStandIn  # noqa: E402
+
+
+# A rack with the given number of ICS425 Modules, each with 6 Channels.
+def rack_item_list(module_count):
+    items = [
+        {"ItemId": 1, "ItemName": "QServer", "ItemNameIdentifier": 1, "ItemType": "Controller", "ItemTypeIdentifier": 1},
+        {"ItemId": 2, "ItemName": "SignalConditioner", "ItemNameIdentifier": 2, "ItemType": "Signal Conditioner", "ItemTypeIdentifier": 2},
+    ]
+    item_id = 3
+    for _ in range(module_count):
+        items.append({"ItemId": item_id, "ItemName": "ICS425", "ItemNameIdentifier": 425, "ItemType": "Module", "ItemTypeIdentifier": 3})
+        item_id += 1
+        for _ in range(6):
+            items.append({"ItemId": item_id, "ItemName": "ICS425", "ItemNameIdentifier": 425, "ItemType": "Channel", "ItemTypeIdentifier": 4})
+            item_id += 1
+    return items
+
+
+# The changes made by the ConfigureICS42 example.
+def update_operation_mode(item_id, operation_mode):
+    for setting in operation_mode["Settings"][0]["SupportedValues"]:
+        if "ICP" in setting["Description"]:
+            operation_mode["Settings"][0]["Value"] = setting["Id"]
+            break
+
+
+def update_settings(item_id, settings):
+    for setting in settings["Settings"]:
+        if "Sample Rate" in setting["Name"]:
+            setting["Value"] = 0
+        elif "Voltage Range" in setting["Name"]:
+            setting["Value"] = 1
+        elif "Coupling" in setting["Name"]:
+            setting["Value"] = 0
+    for setting in settings.get("Data", []):
+        if "Streaming" in setting["Name"]:
+            setting["Value"] = 1
+        elif "Local Storage" in setting["Name"]:
+            setting["Value"] = 0
+
+
+# The serial approach of the ConfigureICS42 example: a new connection per request, one Item after the other.
+def configure_serial(url, item_ids):
+    for item_id in item_ids:
+        operation_mode = requests.get(url + "/item/operationMode/", params={"itemId": item_id}).json()
+        update_operation_mode(item_id, operation_mode)
+        requests.put(url + "/item/operationMode/", params={"itemId": item_id}, json=operation_mode)
+
+        settings = requests.get(url + "/item/settings/", params={"itemId": item_id}).json()
+        update_settings(item_id, settings)
+        requests.put(url + "/item/settings/", params={"itemId": item_id}, json=settings)
+    requests.put(url + "/system/settings/apply")
+
+
+def configure_concurrent(ip, port, item_ids, worker_count):
+    with ConfigurationClient(ip, port, worker_count=worker_count) as client:
+        client.configure(item_ids, update_operation_mode, update_settings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare serial and concurrent configuration against a local QServer stand-in.")
+    parser.add_argument("--modules", type=int, default=8, help="Number of ICS425 Modules in the rack")
+    parser.add_argument("--latency", type=float, default=0.01, help="Latency in seconds added to every request")
+    parser.add_argument("--workers", type=int, default=8, help="Number of Items configured concurrently")
+    arguments = parser.parse_args()
+
+    items = rack_item_list(arguments.modules)
+    item_ids = [item["ItemId"] for item in items if item["ItemType"] in ("Module", "Channel")]
+
+    with QServerStandIn(latency=arguments.latency, item_list=items) as stand_in:
+        start = time.perf_counter()
+        configure_serial(stand_in.url, item_ids)
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        configure_concurrent("127.0.0.1", stand_in.http_port, item_ids, arguments.workers)
+        concurrent_time = time.perf_counter() - start
+
+    print("Items configured:", len(item_ids), "with", arguments.latency * 1000, "ms latency per request")
+    print("Serial:     {:.2f} s".format(serial_time))
+    print("Concurrent: {:.2f} s ({} workers)".format(concurrent_time, arguments.workers))
+    print("Speedup:    {:.1f}x".format(serial_time / concurrent_time))
@@ -0,0 +1,122 @@
+# QServer introduction to Python: A reusable client for configuring Items.
+# The ConfigureICS42 example opens a new connection for every request and configures the Channels one after the other.
+# On a full rack that adds up to hundreds of round trips in a row. This client improves on that in three ways:
+# - A requests.Session keeps the connections open and reuses them, with retries for failed requests.
+# - Independent Items are configured concurrently by a bounded pool of threads. Within an Item the order is kept:
+#   the operation mode is set before the settings are requested, since the settings depend on the operation mode.
+# - The settings are applied once, after all Items have been configured.
+
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class ConfigurationClient:
+    # The worker count is the number of Items configured at the same time, and also the size of the connection pool.
+    # Failed requests are retried with an exponential backoff. Sending the same operation mode or settings of an Item
+    # twice leaves the Item as sending it once, hence those PUT requests are retried as well.
+    # Applying the settings reconfigures the hardware and can take much longer than the other requests. It has its own
+    # timeout and is only retried when the connection could not be established, as then QServer never received it.
+    # The item cache is an optional ItemIndexCache from the PythonBasicsItemList folder, it is invalidated on apply.
+    def __init__(self, ip, port=8080, worker_count=8, retries=3, backoff_factor=0.1, timeout=10.0, apply_timeout=60.0, item_cache=None):
+        self.url = "http://" + ip + ":" + str(port)
+        self.worker_count = worker_count
+        self.timeout = timeout
+        self.apply_timeout = apply_timeout
+        self.item_cache = item_cache
+
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(502, 503, 504), allowed_methods=("GET", "PUT"))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=worker_count, max_retries=retry)
+        apply_retry = Retry(total=retries, connect=retries, read=0, status=0, other=0, backoff_factor=backoff_factor)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        # The session uses the adapter with the longest matching prefix.
+        self.session.mount(self.url + "/system/settings/apply", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=apply_retry))
+
+    def get(self, path, item_id=None, error_message=None):
+        params = {"itemId": item_id} if item_id is not None else None
+        response = self.session.get(self.url + path, params=params, timeout=self.timeout)
+        if response.status_code != 200:
+            raise ConnectionError(error_message or "Request failed: GET " + path)
+        return response.json()
+
+    def put(self, path, item_id=None, document=None, error_message=None, timeout=None):
+        params = {"itemId": item_id} if item_id is not None else None
+        response = self.session.put(self.url + path, params=params, json=document, timeout=timeout or self.timeout)
+        if response.status_code != 200:
+            raise ConnectionError(error_message or "Request failed: PUT " + path)
+        return response
+
+    def ping(self):
+        try:
+            return self.session.get(self.url + "/info/ping/", timeout=self.timeout).status_code == 200
+        except requests.ConnectionError:
+            return False
+
+    def item_list(self):
+        return self.get("/item/list/", error_message="Failed to receive item list")
+
+    # The ItemIndex of the controller, from the item cache when one is set.
+    def item_index(self):
+        if self.item_cache is None:
+            raise ValueError("No item cache set")
+        return self.item_cache.get(self.url)
+
+    def get_operation_mode(self, item_id):
+        return self.get("/item/operationMode/", item_id, "Failed to receive item operation mode for ItemId: " + str(item_id))
+
+    def set_operation_mode(self, item_id, operation_mode):
+        self.put("/item/operationMode/", item_id, operation_mode, "Failed to set item operation mode for ItemId: " + str(item_id))
+
+    def get_settings(self, item_id):
+        return self.get("/item/settings/", item_id, "Failed to receive item settings for ItemId: " + str(item_id))
+
+    def set_settings(self, item_id, settings):
+        self.put("/item/settings/", item_id, settings, "Failed to set item settings for ItemId: " + str(item_id))
+
+    # Apply the settings; this reconfigures the hardware.
+    def apply(self):
+        self.put("/system/settings/apply", error_message="Failed to apply settings", timeout=self.apply_timeout)
+        if self.item_cache is not None:
+            self.item_cache.invalidate(self.url)
+
+    # Configure a single Item. The update functions are called with the ItemId and the document to change in place,
+    # and return False to leave the document unchanged, in which case it is not sent back to QServer.
+    def configure_item(self, item_id, update_operation_mode=None, update_settings=None):
+        if update_operation_mode is not None:
+            operation_mode = self.get_operation_mode(item_id)
+            if update_operation_mode(item_id, operation_mode) is not False:
+                self.set_operation_mode(item_id, operation_mode)
+
+        if update_settings is not None:
+            settings = self.get_settings(item_id)
+            if update_settings(item_id, settings) is not False:
+                self.set_settings(item_id, settings)
+
+    # Configure several Items concurrently, then apply the settings once.
+    # If any Item fails, the first error is raised and the settings are not applied.
+    def configure(self, item_ids, update_operation_mode=None, update_settings=None, apply=True):
+        self.configure_items([(item_id, update_operation_mode, update_settings) for item_id in item_ids], apply)
+
+    # Same as configure, with the update functions given per Item as (ItemId, update_operation_mode, update_settings).
+    def configure_items(self, tasks, apply=True):
+        self.run_concurrently(self.configure_item, tasks)
+        if apply:
+            self.apply()
+
+    # Call the function for every tuple of arguments, concurrently; returns the results in order.
+    # If any call fails, the first error is raised once all calls have finished.
+    def run_concurrently(self, function, arguments):
+        with ThreadPoolExecutor(max_workers=self.worker_count) as executor:
+            futures = [executor.submit(function, *argument) for argument in arguments]
+            return [future.result() for future in futures]
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
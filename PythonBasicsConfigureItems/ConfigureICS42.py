@@ -178,5 +178,6 @@ print("Settings applied successfully")
 # That's it! The ICS42 Module and Channels have been configured and the system is ready to stream data.
 # All of the setting values used in this example can be found in the QuantusSoftware manual available on GitHub.
 # Alternatively you can use the "SupportedValues" field to find the available values for each setting making it easy to build a GUI.
+# When configuring many Items, have a look at the ConfigurationClient, which reuses connections and configures Items concurrently.
 
 # Next you might want to steam data, please refer to the PythonBasicsStreamData example for more information.
\ No newline at end of file
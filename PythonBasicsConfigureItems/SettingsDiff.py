@@ -0,0 +1,150 @@
+# QServer introduction to Python: Only sending the settings that actually change.
+# Applying settings reconfigures the hardware and interrupts streaming, even if none of the values changed.
+# Instead of writing every setting on every deploy, describe the desired state and let this module compare it with the
+# current state of the system. Only Items with a difference are sent to QServer, and the settings are only applied when
+# something changed.
+#
+# The desired state lists the Items to configure, selected by ItemId or by ItemName (optionally with an ItemType).
+# The values are given per setting name for the operation mode, the settings and the Data (Streaming/Local Storage):
+# {
+#     "Items": [
+#         {"ItemName": "ICS425", "ItemType": "Module", "Settings": {"Sample Rate": 0}},
+#         {"ItemName": "ICS425", "ItemType": "Channel",
+#          "OperationMode": {"Operation Mode": "ICP Powered"},
+#          "Settings": {"Voltage Range": 1, "Coupling": 0},
+#          "Data": {"Streaming": 1, "Local Storage": 0}},
+#         {"ItemId": 7, "Settings": {"Coupling": 1}}
+#     ]
+# }
+# A value can be the Id of a supported value, or its Description, which is looked up in the "SupportedValues" field.
+# Items listed more than once get the values of all their entries, the later entries taking precedence.
+
+import json
+from collections import namedtuple
+
+# A single difference between the current and the desired state.
+# The section is "OperationMode", "Settings" or "Data".
+SettingChange = namedtuple("SettingChange", ["item_id", "section", "name", "current_value", "desired_value"])
+
+
+def load_desired_state(path):
+    with open(path) as desired_file:
+        return json.load(desired_file)
+
+
+# Find the ItemIds each entry of the desired state refers to, and merge the values per ItemId.
+def resolve_items(item_list, desired_state):
+    targets = {}
+    for entry in desired_state["Items"]:
+        if "ItemId" in entry:
+            matches = [item for item in item_list if item["ItemId"] == entry["ItemId"]]
+        else:
+            matches = [item for item in item_list if item["ItemName"] == entry["ItemName"]
+                       and ("ItemType" not in entry or item["ItemType"] == entry["ItemType"])]
+        if not matches:
+            raise ValueError("No Item found for " + json.dumps(entry))
+
+        for item in matches:
+            target = targets.setdefault(item["ItemId"], {"OperationMode": {}, "Settings": {}, "Data": {}})
+            for section in target:
+                target[section].update(entry.get(section, {}))
+    return targets
+
+
+# Translate a desired value into the value QServer expects, using the supported values of the setting if it has them.
+def resolve_value(setting, value):
+    supported_values = setting.get("SupportedValues")
+    if not supported_values:
+        return value
+    for supported_value in supported_values:
+        if value == supported_value["Id"] or value == supported_value.get("Description"):
+            return supported_value["Id"]
+    raise ValueError("Value " + repr(value) + " is not supported by setting " + repr(setting["Name"]))
+
+
+# Compare the settings in a document section with the desired values by name, and change the document in place.
+# Returns the list of changes; an empty list means the document already is in the desired state.
+def diff_section(item_id, section, settings, desired_values):
+    by_name = {setting["Name"]: setting for setting in settings}
+    changes = []
+    for name, value in desired_values.items():
+        setting = by_name.get(name)
+        if setting is None:
+            raise ValueError("ItemId " + str(item_id) + " has no " + section + " setting named " + repr(name))
+        desired_value = resolve_value(setting, value)
+        if setting["Value"] != desired_value:
+            changes.append(SettingChange(item_id, section, name, setting["Value"], desired_value))
+            setting["Value"] = desired_value
+    return changes
+
+
+class SettingsDiffEngine:
+    # The client is a ConfigurationClient, which sends the requests concurrently per Item.
+    def __init__(self, client):
+        self.client = client
+        self.targets = {}
+
+    def item_list(self):
+        if self.client.item_cache is not None:
+            return self.client.item_index().items
+        return self.client.item_list()
+
+    # Bring the system into the desired state and return the list of changes made.
+    # With dry_run set nothing is sent, the changes that would be made are returned instead. Note that the settings of
+    # an Item depend on its operation mode, hence a dry run compares the settings of the current operation mode.
+    #
+    # The deploy runs in two steps, so a mistake in the desired state does not leave the system half configured:
+    # first the documents of all Items are requested and compared, which raises a ValueError for an unknown setting name
+    # or an unsupported value before anything is sent. Only then the changed documents are sent back.
+    def deploy(self, desired_state, dry_run=False):
+        targets = self.targets = resolve_items(self.item_list(), desired_state)
+        item_ids = list(targets)
+
+        # Only the sections with desired values are requested, e.g. an Item with only settings keeps its operation mode.
+        def fetch(item_id):
+            target = targets[item_id]
+            operation_mode = self.client.get_operation_mode(item_id) if target["OperationMode"] else None
+            settings = self.client.get_settings(item_id) if target["Settings"] or target["Data"] else None
+            return operation_mode, settings
+
+        documents = dict(zip(item_ids, self.client.run_concurrently(fetch, [(item_id,) for item_id in item_ids])))
+        diffs = {item_id: self.diff_item(item_id, *documents[item_id]) for item_id in item_ids}
+        changes = [change for operation_mode_changes, settings_changes in diffs.values() for change in operation_mode_changes + settings_changes]
+
+        if not dry_run:
+            def write(item_id):
+                operation_mode, settings = documents[item_id]
+                operation_mode_changes, settings_changes = diffs[item_id]
+                if operation_mode_changes:
+                    self.client.set_operation_mode(item_id, operation_mode)
+                    if settings is not None:
+                        # A new operation mode comes with its own settings, which are compared again.
+                        settings = self.client.get_settings(item_id)
+                        settings_changes = self.diff_settings(item_id, settings)
+                if settings_changes:
+                    self.client.set_settings(item_id, settings)
+                return settings_changes
+
+            written = self.client.run_concurrently(write, [(item_id,) for item_id in item_ids])
+            changes = [change for item_id in item_ids for change in diffs[item_id][0]]
+            changes += [change for settings_changes in written for change in settings_changes]
+
+            # Applying interrupts streaming, hence it is skipped when nothing changed.
+            if changes:
+                self.client.apply()
+        return sorted(changes, key=lambda change: (change.item_id, change.section, change.name))
+
+    # Compare the documents of an Item with its desired values; returns the operation mode changes and the settings changes.
+    def diff_item(self, item_id, operation_mode, settings):
+        operation_mode_changes = []
+        if operation_mode is not None:
+            operation_mode_changes = diff_section(item_id, "OperationMode", operation_mode["Settings"], self.targets[item_id]["OperationMode"])
+        settings_changes = self.diff_settings(item_id, settings) if settings is not None else []
+        return operation_mode_changes, settings_changes
+
+    def diff_settings(self, item_id, settings):
+        target = self.targets[item_id]
+        changes = diff_section(item_id, "Settings", settings.get("Settings", []), target["Settings"])
+        if target["Data"]:
+            changes += diff_section(item_id, "Data", settings.get("Data", []), target["Data"])
+        return changes
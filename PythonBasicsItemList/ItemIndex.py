@@ -0,0 +1,186 @@
+# QServer introduction to Python: Indexing the item list.
+# The item list is a flat list, ordered like a tree: the Controller comes first, followed by its Signal Conditioners,
+# and every Signal Conditioner is followed by its Modules, and every Module by its Channels.
+# The ItemIndex builds that tree once and keeps dictionaries by ItemId, ItemName, ItemNameIdentifier and
+# ItemTypeIdentifier, so questions like "all Channels of Module X" no longer need a scan of the whole list.
+# The ItemIndexCache keeps the index per controller in memory and, optionally, on disk, so tools do not have to
+# download the item list on every run. A cached index is dropped after the settings are applied, or when a cheap probe
+# of the controller no longer matches. A maximum age can be given as well.
+
+import hashlib
+import json
+import os
+import time
+import requests
+
+# The depth of every Item Type in the tree.
+ITEM_TYPE_LEVELS = {"Controller": 0, "Signal Conditioner": 1, "Module": 2, "Channel": 3}
+
+
+class ItemIndex:
+    def __init__(self, item_list):
+        self.items = item_list
+        self.by_id = {}
+        self.by_name = {}
+        self.by_name_identifier = {}
+        self.by_type_identifier = {}
+        self.by_type = {}
+        self.parents = {}
+        self.children = {}
+        self.roots = []
+
+        # The most recent Item seen at every level of the tree; an Item's parent is the most recent Item one level up.
+        # When a level is missing, e.g. a Module directly below the Controller, the nearest level above is used.
+        ancestors = [None] * len(ITEM_TYPE_LEVELS)
+        for item in item_list:
+            item_id = item["ItemId"]
+            self.by_id[item_id] = item
+            self.by_name.setdefault(item["ItemName"], []).append(item)
+            self.by_name_identifier.setdefault(item["ItemNameIdentifier"], []).append(item)
+            self.by_type_identifier.setdefault(item["ItemTypeIdentifier"], []).append(item)
+            self.by_type.setdefault(item["ItemType"], []).append(item)
+            self.children.setdefault(item_id, [])
+
+            level = ITEM_TYPE_LEVELS.get(item["ItemType"], len(ITEM_TYPE_LEVELS) - 1)
+            parent = next((ancestor for ancestor in reversed(ancestors[:level]) if ancestor is not None), None)
+            if parent is None:
+                self.roots.append(item)
+            else:
+                self.parents[item_id] = parent["ItemId"]
+                self.children[parent["ItemId"]].append(item)
+
+            ancestors[level] = item
+            for deeper in range(level + 1, len(ancestors)):
+                ancestors[deeper] = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, item_id):
+        return self.by_id[item_id]
+
+    def parent(self, item_id):
+        parent_id = self.parents.get(item_id)
+        return None if parent_id is None else self.by_id[parent_id]
+
+    def children_of(self, item_id, item_type=None):
+        children = self.children.get(item_id, [])
+        if item_type is None:
+            return children
+        return [child for child in children if child["ItemType"] == item_type]
+
+    # The Channels of a Module.
+    def channels_of(self, module_id):
+        return self.children_of(module_id, "Channel")
+
+    # Find Items by name and/or type, e.g. find(item_name="ICS425", item_type="Module").
+    def find(self, item_name=None, item_type=None):
+        if item_name is not None:
+            items = self.by_name.get(item_name, [])
+            return items if item_type is None else [item for item in items if item["ItemType"] == item_type]
+        return self.by_type.get(item_type, []) if item_type is not None else self.items
+
+
+# The fingerprint of an item list, used to check if a cached index still describes the same system.
+def item_list_fingerprint(item_list):
+    return hashlib.sha1(json.dumps(item_list, sort_keys=True).encode()).hexdigest()
+
+
+# The default check of a controller: the operation mode document of the Controller, a single small request.
+# It changes when the operation mode of the system changes, which also changes the Modules and Channels in use.
+def controller_probe(url, index, session=requests):
+    return probe_items(url, index.roots, session)
+
+
+# A thorough check: the operation mode documents of the Controller and of every Module.
+# A Module which was swapped or removed answers differently, or not at all, hence the probe changes with the item set.
+# It costs one small request per Module, pass it as the probe of the ItemIndexCache when Modules are swapped often.
+def module_probe(url, index, session=requests):
+    return probe_items(url, index.roots + index.find(item_type="Module"), session)
+
+
+def probe_items(url, items, session):
+    probed = []
+    for item in items:
+        response = session.get(url + "/item/operationMode/", params={"itemId": item["ItemId"]})
+        probed.append([item["ItemId"], response.status_code, response.json() if response.status_code == 200 else None])
+    return hashlib.sha1(json.dumps(probed, sort_keys=True).encode()).hexdigest()
+
+
+class ItemIndexCache:
+    # The cache directory is optional, without it the index is only kept in memory.
+    # An index older than the maximum age in seconds is always downloaded again; by default an index is kept for as
+    # long as the probe does not change.
+    # The probe is a function of (url, index, session) returning a value that changes when the system changes, such as
+    # controller_probe or module_probe; set it to None to trust the cache without any request.
+    def __init__(self, cache_directory=None, max_age=None, probe=controller_probe, session=None):
+        self.cache_directory = cache_directory
+        self.max_age = max_age
+        self.probe = probe
+        self.session = session or requests.Session()
+        self.entries = {}
+        if cache_directory is not None:
+            os.makedirs(cache_directory, exist_ok=True)
+
+    def cache_path(self, url):
+        return os.path.join(self.cache_directory, hashlib.sha1(url.encode()).hexdigest() + ".json")
+
+    def download(self, url):
+        response = self.session.get(url + "/item/list/")
+        if response.status_code != 200:
+            raise ConnectionError("Failed to receive item list")
+        item_list = response.json()
+        index = ItemIndex(item_list)
+        entry = {"Url": url, "Time": time.time(), "Fingerprint": item_list_fingerprint(item_list), "Probe": None, "Items": item_list}
+        if self.probe is not None:
+            entry["Probe"] = self.probe(url, index, self.session)
+        return entry, index
+
+    def load(self, url):
+        if self.cache_directory is None:
+            return None
+        try:
+            with open(self.cache_path(url)) as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if entry.get("Url") != url or entry.get("Fingerprint") != item_list_fingerprint(entry.get("Items")):
+            return None
+        return entry, ItemIndex(entry["Items"])
+
+    def store(self, entry):
+        if self.cache_directory is None:
+            return
+        path = self.cache_path(entry["Url"])
+        with open(path + ".tmp", "w") as cache_file:
+            json.dump(entry, cache_file)
+        os.replace(path + ".tmp", path)
+
+    def is_valid(self, url, entry, index):
+        if self.max_age is not None and time.time() - entry["Time"] > self.max_age:
+            return False
+        return self.probe is None or self.probe(url, index, self.session) == entry["Probe"]
+
+    # Get the index of the controller at the given url, e.g. "http://192.168.100.47:8080".
+    # An index held in memory is returned without any request; it is only checked when it was loaded from disk.
+    def get(self, url):
+        cached = self.entries.get(url)
+        if cached is not None and (self.max_age is None or time.time() - cached[0]["Time"] <= self.max_age):
+            return cached[1]
+
+        cached = self.load(url)
+        if cached is None or not self.is_valid(url, *cached):
+            cached = self.download(url)
+            self.store(cached[0])
+
+        self.entries[url] = cached
+        return cached[1]
+
+    # Drop the index of a controller, call this after /system/settings/apply.
+    def invalidate(self, url):
+        self.entries.pop(url, None)
+        if self.cache_directory is not None:
+            try:
+                os.remove(self.cache_path(url))
+            except OSError:
+                pass
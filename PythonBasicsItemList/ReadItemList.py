@@ -50,4 +50,11 @@ else:
     print("Failed to receive item list")
     exit()
 
+# To avoid scanning the list every time you look for an Item, the ItemIndex module builds the tree once and indexes it.
+# For example, the Channels of every Module can then be found directly:
+#     index = ItemIndex(item_list)
+#     for module in index.find(item_type="Module"):
+#         print(module["ItemName"], [channel["ItemId"] for channel in index.channels_of(module["ItemId"])])
+# The ItemIndexCache can also keep the index on disk, so your tools don't need to download the item list on every run.
+
 # That is it for this example. Find more examples in the Examples folders or read the QServer documentation for more.
\ No newline at end of file
@@ -0,0 +1,227 @@
+# QServer introduction to Python: Benchmarking the stream client and the configuration workflow.
+# Every benchmark runs against a QServerStandIn, hence no controller is needed.
+# The stream benchmarks report the MB/s and samples/s decoded by the StreamClient, the latency from the TransmitTimestamp
+# of a frame until it is decoded, and the peak memory (RSS) used. Every benchmark runs in its own process, so the peak
+# memory of one benchmark does not hide that of the next.
+# The pipeline benchmarks decode the same stream with a StreamPipeline of 1, 2, 4... worker processes, to show how the
+# throughput scales with the worker count, and check that the frames still come out in SequenceNumber order.
+# Every stream benchmark also reports the CPU time its process spends per frame; the stand-in runs in that process too.
+# For a pipeline this is the reading and sequencing, which the workers cannot take over. With a core for every worker
+# the pipeline outruns the single loop when its CpuUsPerFrame is below that of the stream benchmark of the same scenario.
+# The results are saved as JSON, pass an earlier result file with --compare to see the difference between two runs.
+#
+# Usage: python BenchmarkSuite.py [--frames N] [--latency SECONDS] [--workers 1,2,4] [--output DIRECTORY] [--compare RESULT_FILE]
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import traceback
+import numpy as np
+import requests
+from QServerStandIn import ChannelSpec, QServerStandIn
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PythonBasicsStreamData"))
+from StreamClient import StreamClient  # noqa: E402
+
+# resource is only available on Unix, the peak memory is not reported on other platforms.
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The channel mixes to benchmark the stream client with.
+STREAM_SCENARIOS = {
+    "analog-float32": [ChannelSpec(channel_id, 0, 0, 51200) for channel_id in range(6)],
+    "analog-int16": [ChannelSpec(channel_id, 0, 1, 51200) for channel_id in range(6)],
+    "analog-int24": [ChannelSpec(channel_id, 0, 2, 51200) for channel_id in range(6)],
+    "analog-int32": [ChannelSpec(channel_id, 0, 3, 51200) for channel_id in range(6)],
+    "analog-int24-wide": [ChannelSpec(channel_id, 0, 2, 51200) for channel_id in range(24)],
+    "mixed": [ChannelSpec(channel_id, 0, channel_id % 4, 25600) for channel_id in range(6)]
+             + [ChannelSpec(6, 1, 0, 1000), ChannelSpec(7, 2, 0, 20000), ChannelSpec(8, 3, 0, 10)],
+}
+
+# The scenarios to run the pipeline benchmarks with; the wide one is dominated by decoding, which the workers take over.
+PIPELINE_SCENARIOS = ["mixed", "analog-int24-wide"]
+
+
+# The peak resident memory of this process in MB.
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports the peak in kB, macOS in bytes.
+    return peak / 1024.0 if sys.platform != "darwin" else peak / (1024.0 * 1024.0)
+
+
+def benchmark_stream(channels, frame_count, frame_duration=0.01):
+    with QServerStandIn(channels, frame_duration=frame_duration) as stand_in:
+        client = StreamClient("127.0.0.1", stand_in.http_port)
+        client.connect()
+        sample_count = stand_in.template.sample_count
+        latencies = []
+        byte_count = 0
+        try:
+            start = time.perf_counter()
+            cpu_start = time.process_time()
+            for frame in client.frames(frame_count):
+                latencies.append(time.time() - frame.header.transmit_timestamp)
+                byte_count += 32 + frame.header.payload_size
+            elapsed = time.perf_counter() - start
+            cpu_time = time.process_time() - cpu_start
+        finally:
+            client.close()
+
+    latencies = np.array(latencies) * 1000.0
+    return {
+        "Frames": frame_count,
+        "MBPerSecond": byte_count / elapsed / 1e6,
+        "SamplesPerSecond": sample_count * frame_count / elapsed,
+        "FramesPerSecond": frame_count / elapsed,
+        "CpuUsPerFrame": cpu_time / frame_count * 1e6,
+        "LatencyMedianMs": float(np.median(latencies)),
+        "LatencyP99Ms": float(np.percentile(latencies, 99)),
+        "PeakRssMB": peak_rss(),
+    }
+
+
+# Decode the stream with a StreamPipeline; the stand-in sends as fast as possible, hence decoding is the bottleneck.
+# The frames must come out in SequenceNumber order without gaps, otherwise the benchmark fails.
+def benchmark_pipeline(channels, frame_count, worker_count, frame_duration=0.01):
+    with QServerStandIn(channels, frame_duration=frame_duration) as stand_in:
+        client = StreamClient("127.0.0.1", stand_in.http_port)
+        client.connect()
+        sample_count = stand_in.template.sample_count
+        previous = None
+        try:
+            with client.open_pipeline(worker_count) as pipeline:
+                start = time.perf_counter()
+                cpu_start = time.process_time()
+                for received, frame in enumerate(pipeline.frames(), 1):
+                    sequence_number = frame.header.sequence_number
+                    if previous is not None and sequence_number != previous + 1:
+                        raise AssertionError("Frame " + str(sequence_number) + " followed frame " + str(previous))
+                    previous = sequence_number
+                    if received == frame_count:
+                        break
+                elapsed = time.perf_counter() - start
+                cpu_time = time.process_time() - cpu_start
+        finally:
+            client.close()
+
+    return {
+        "Workers": worker_count,
+        "Frames": frame_count,
+        "SamplesPerSecond": sample_count * frame_count / elapsed,
+        "FramesPerSecond": frame_count / elapsed,
+        "CpuUsPerFrame": cpu_time / frame_count * 1e6,
+        "PeakRssMB": peak_rss(),
+    }
+
+
+# The configuration workflow of the ConfigureICS42 example: find the ICS42 Items, set the operation mode and settings
+# of the Module and all Channels, then apply the settings.
+def benchmark_configuration(latency):
+    with QServerStandIn(latency=latency) as stand_in:
+        url = stand_in.url
+        start = time.perf_counter()
+
+        requests.get(url + "/info/ping/")
+        item_list = requests.get(url + "/item/list/").json()
+        item_ids = [item["ItemId"] for item in item_list if item["ItemName"] in ("ICS421", "ICS425") and item["ItemType"] in ("Module", "Channel")]
+        for item_id in item_ids:
+            operation_mode = requests.get(url + "/item/operationMode/", params={"itemId": item_id}).json()
+            requests.put(url + "/item/operationMode/", params={"itemId": item_id}, json=operation_mode)
+            settings = requests.get(url + "/item/settings/", params={"itemId": item_id}).json()
+            requests.put(url + "/item/settings/", params={"itemId": item_id}, json=settings)
+        requests.put(url + "/system/settings/apply")
+
+        elapsed = time.perf_counter() - start
+        return {"Requests": stand_in.request_count, "Seconds": elapsed, "RequestsPerSecond": stand_in.request_count / elapsed, "PeakRssMB": peak_rss()}
+
+
+# The benchmark sends back its result, or the traceback of the error it failed with.
+def run_in_process(results, name, function, *args):
+    try:
+        results.put((name, function(*args), None))
+    except Exception:
+        results.put((name, None, traceback.format_exc()))
+
+
+# Run a benchmark in a separate process and return its result.
+# A benchmark which fails, or whose process dies without a result, raises a RuntimeError instead of waiting forever.
+def run_isolated(name, function, *args):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run_in_process, args=(results, name, function) + args)
+    process.start()
+    try:
+        while True:
+            try:
+                _, result, error = results.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not process.is_alive() and results.empty():
+                    raise RuntimeError("Benchmark " + name + " exited with code " + str(process.exitcode) + " without a result")
+    finally:
+        process.join(timeout=10.0)
+        if process.is_alive():
+            process.terminate()
+    if error is not None:
+        raise RuntimeError("Benchmark " + name + " failed:\n" + error)
+    return result
+
+
+def print_results(results, previous=None):
+    for name, result in results.items():
+        print(name)
+        for key, value in result.items():
+            line = "    {:<20}{:>16}".format(key, "-" if value is None else "{:,.2f}".format(value))
+            previous_value = (previous or {}).get(name, {}).get(key)
+            if previous_value and value is not None:
+                line += "  ({:+.1f}%)".format((value - previous_value) / previous_value * 100.0)
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the stream client and configuration workflow against a local QServer stand-in.")
+    parser.add_argument("--frames", type=int, default=2000, help="Frames to decode per stream benchmark")
+    parser.add_argument("--latency", type=float, default=0.002, help="Latency in seconds added to every HTTP request")
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated worker counts for the pipeline benchmarks")
+    parser.add_argument("--output", default="benchmark_results", help="Directory to save the results in")
+    parser.add_argument("--compare", help="An earlier result file to compare with")
+    arguments = parser.parse_args()
+
+    benchmarks = [("stream/" + name, benchmark_stream, (channels, arguments.frames)) for name, channels in STREAM_SCENARIOS.items()]
+    for name in PIPELINE_SCENARIOS:
+        for worker_count in [int(count) for count in arguments.workers.split(",")]:
+            benchmarks.append(("pipeline/" + name + "/" + str(worker_count) + "-workers", benchmark_pipeline,
+                               (STREAM_SCENARIOS[name], arguments.frames, worker_count)))
+    benchmarks.append(("configuration", benchmark_configuration, (arguments.latency,)))
+
+    # A failing benchmark is reported, the others still run.
+    results = {}
+    failures = []
+    for name, function, benchmark_arguments in benchmarks:
+        try:
+            results[name] = run_isolated(name, function, *benchmark_arguments)
+        except RuntimeError as error:
+            print(error)
+            failures.append(name)
+
+    previous = None
+    if arguments.compare:
+        with open(arguments.compare) as previous_file:
+            previous = json.load(previous_file)["Results"]
+    print_results(results, previous)
+
+    os.makedirs(arguments.output, exist_ok=True)
+    output_path = os.path.join(arguments.output, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output_path, "w") as output_file:
+        json.dump({"Time": time.time(), "Frames": arguments.frames, "Latency": arguments.latency, "Results": results}, output_file, indent=4)
+    print("Results saved to", output_path)
+    if failures:
+        print("Failed:", ", ".join(failures))
+        exit(1)
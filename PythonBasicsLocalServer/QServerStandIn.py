@@ -0,0 +1,356 @@
+# QServer introduction to Python: A local stand-in for QServer.
+# The other examples need a controller to talk to. This stand-in serves the REST endpoints they use and a synthetic
+# TCP data stream, so the examples and benchmarks can run on any machine.
+# The following endpoints are served on the HTTP port:
+# - GET /info/ping/
+# - GET /item/list/
+# - GET and PUT /item/operationMode/?itemId=...
+# - GET and PUT /item/settings/?itemId=...
+# - PUT /system/settings/apply
+# - GET /datastream/setup/
+# The data stream delivers frames with the channels given to the stand-in. Analog (SampleTypes 0 to 3), Counter, CAN and
+# GPS Channels are supported. The channel data is generated once and the same payload is sent for every frame, with only
+# the sequence number and timestamps updated, hence the stand-in itself needs very little CPU. The number of CAN messages
+# differs from frame to frame on a real bus, hence with CAN Channels a few payloads with different message counts are
+# generated, which are sent in turn.
+#
+# Run this file to start a stand-in on the default ports, then point the other examples at 127.0.0.1.
+
+import copy
+import json
+import socket
+import struct
+import threading
+import time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+
+# The frame header and the channel headers, as described in the StreamData example.
+header_struct = struct.Struct('<QdfIII')
+generic_header_struct = struct.Struct('<iiIIQ')
+analog_header_struct = struct.Struct('<iifff')
+can_message_struct = struct.Struct('<dIBBBB')
+gps_header_struct = struct.Struct('<QHBB')
+
+# A channel in the synthetic data stream. The sample rate is in samples per second,
+# for CAN Channels it is the number of messages per second instead.
+ChannelSpec = namedtuple("ChannelSpec", ["channel_id", "channel_type", "sample_type", "sample_rate"])
+ChannelSpec.__new__.__defaults__ = (0, 51200)
+
+# Six ICS42 Channels delivering 24-bit raw data, the most common configuration.
+DEFAULT_CHANNELS = [ChannelSpec(channel_id, 0, 2, 51200) for channel_id in range(5, 11)]
+
+# The timestamps in the Generic Channel Header are given in nanoseconds.
+TICKS_PER_SECOND = 1000000000
+
+
+# Build the Specific Channel Header and data of a channel for one frame.
+# Returns the ChannelDataSize and the bytes following the Generic Channel Header.
+def build_channel_block(channel, samples_per_frame, rng):
+    if channel.channel_type == 0:
+        header = analog_header_struct.pack(1, 0, 0.0, -1.0, 1.0)
+        signal = np.sin(np.linspace(0, 2 * np.pi, samples_per_frame, endpoint=False))
+        if channel.sample_type == 0:
+            data = signal.astype('<f4').tobytes()
+            return len(data), header + data
+
+        scaling_factor = struct.pack('<f', 1.0 / 2 ** 31)
+        if channel.sample_type == 1:
+            data = (signal * 32767).astype('<i2').tobytes()
+            scaling_factor = struct.pack('<f', 1.0 / 32767)
+        elif channel.sample_type == 2:
+            # 24-bit samples are delivered as the upper three bytes of a 32-bit integer.
+            data = (signal * 2 ** 31 * 0.99).astype('<i4').view(np.uint8).reshape(-1, 4)[:, 1:].tobytes()
+        elif channel.sample_type == 3:
+            data = (signal * 2 ** 31 * 0.99).astype('<i4').tobytes()
+        else:
+            raise ValueError("Unknown SampleType: " + str(channel.sample_type))
+        return len(data), header + scaling_factor + data
+
+    elif channel.channel_type == 1:
+        data = np.linspace(1000.0, 1001.0, samples_per_frame).astype('<f8').tobytes()
+        return len(data), data
+
+    elif channel.channel_type == 2:
+        # A mix of classic CAN and CAN FD messages with up to 64 data bytes.
+        data = b""
+        for message in range(samples_per_frame):
+            dlc = int(rng.choice([0, 2, 8, 12, 16, 32, 48, 64]))
+            data += can_message_struct.pack(message * 1e-4, 0x100 + message % 32, 0, 0, 0, dlc) + rng.integers(0, 256, dlc, dtype=np.uint8).tobytes()
+        return len(data), bytes(24) + data
+
+    elif channel.channel_type == 3:
+        data = b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47\r\n"
+        return len(data), gps_header_struct.pack(0, 100, 1, 18) + data
+
+    raise ValueError("Unknown Channel Type: " + str(channel.channel_type))
+
+
+# The synthetic payloads; every connection patches the timestamps in its own copy for every frame.
+# With CAN Channels there are several variants, with from 75% up to 125% of the messages given by the sample rate.
+class PayloadTemplate:
+    def __init__(self, channels, frame_duration, seed=0, variant_count=8):
+        rng = np.random.default_rng(seed)
+        if not any(channel.channel_type == 2 for channel in channels):
+            variant_count = 1
+        self.payloads = []
+        self.timestamp_offsets = []
+        for variant in range(variant_count):
+            message_scale = 0.75 + 0.5 * variant / (variant_count - 1) if variant_count > 1 else 1.0
+            payload = bytearray()
+            timestamp_offsets = []
+            for channel in channels:
+                samples_per_frame = max(1, int(round(channel.sample_rate * frame_duration * (message_scale if channel.channel_type == 2 else 1.0))))
+                channel_data_size, block = build_channel_block(channel, samples_per_frame, rng)
+                timestamp_offsets.append(len(payload) + 16)
+                payload += generic_header_struct.pack(channel.channel_id, channel.sample_type, channel.channel_type, channel_data_size, 0)
+                payload += block
+            self.payloads.append(payload)
+            self.timestamp_offsets.append(timestamp_offsets)
+
+        self.sample_count = sum(max(1, int(round(channel.sample_rate * frame_duration))) for channel in channels if channel.channel_type in (0, 1))
+
+    # The variant to send as the frame with the given sequence number.
+    def variant(self, sequence_number):
+        return sequence_number % len(self.payloads)
+
+    def build(self, payload, variant, timestamp):
+        for offset in self.timestamp_offsets[variant]:
+            struct.pack_into('<Q', payload, offset, timestamp)
+
+
+# The items of a system with a single ICS425 Module with 6 Channels.
+def default_item_list():
+    items = [
+        {"ItemId": 1, "ItemName": "QServer", "ItemNameIdentifier": 1, "ItemType": "Controller", "ItemTypeIdentifier": 1},
+        {"ItemId": 2, "ItemName": "SignalConditioner", "ItemNameIdentifier": 2, "ItemType": "Signal Conditioner", "ItemTypeIdentifier": 2},
+        {"ItemId": 3, "ItemName": "ICS425", "ItemNameIdentifier": 425, "ItemType": "Module", "ItemTypeIdentifier": 3},
+    ]
+    for channel_number in range(6):
+        items.append({"ItemId": 5 + channel_number, "ItemName": "ICS425", "ItemNameIdentifier": 425, "ItemType": "Channel", "ItemTypeIdentifier": 4})
+    return items
+
+
+def default_operation_mode(item):
+    supported_values = [{"Id": 0, "Description": "Voltage"}, {"Id": 1, "Description": "ICP Powered"}]
+    return {"ItemId": item["ItemId"], "ItemName": item["ItemName"], "SettingsApplied": True,
+            "Settings": [{"Name": "Operation Mode", "Type": "Enumeration", "Value": 0, "SupportedValues": supported_values}]}
+
+
+def default_settings(item):
+    settings = {"ItemId": item["ItemId"], "ItemName": item["ItemName"], "SettingsApplied": True, "Settings": []}
+    if item["ItemType"] == "Module":
+        settings["Settings"].append({"Name": "Sample Rate", "Type": "Enumeration", "Value": 1,
+                                     "SupportedValues": [{"Id": 0, "Description": "51200 Hz"}, {"Id": 1, "Description": "25600 Hz"}]})
+    elif item["ItemType"] == "Channel":
+        settings["Settings"].append({"Name": "Voltage Range", "Type": "Enumeration", "Value": 0,
+                                     "SupportedValues": [{"Id": 0, "Description": "10 V"}, {"Id": 1, "Description": "1 V"}]})
+        settings["Settings"].append({"Name": "Coupling", "Type": "Enumeration", "Value": 1,
+                                     "SupportedValues": [{"Id": 0, "Description": "DC"}, {"Id": 1, "Description": "AC"}]})
+        settings["Data"] = [{"Name": "Streaming", "Type": "Boolean", "Value": 0}, {"Name": "Local Storage", "Type": "Boolean", "Value": 1}]
+    return settings
+
+
+class QServerStandIn:
+    # The channels describe the data stream, the frame duration is the time covered by one frame.
+    # With realtime enabled the frames are sent at the rate a controller would send them, otherwise as fast as possible.
+    # The latency, in seconds, is added to every HTTP request to mimic a controller on a slow network.
+    def __init__(self, channels=None, frame_duration=0.01, realtime=False, latency=0.0, host="127.0.0.1", http_port=0, tcp_port=0, item_list=None):
+        self.channels = list(channels or DEFAULT_CHANNELS)
+        self.frame_duration = frame_duration
+        self.realtime = realtime
+        self.latency = latency
+        self.host = host
+
+        self.items = item_list or default_item_list()
+        self.operation_modes = {item["ItemId"]: default_operation_mode(item) for item in self.items}
+        self.settings = {item["ItemId"]: default_settings(item) for item in self.items}
+        self.apply_count = 0
+        self.request_count = 0
+        self.lock = threading.Lock()
+
+        self.template = PayloadTemplate(self.channels, frame_duration)
+        self.stream_connections = []
+        self.sequence_number = 0
+        self.running = threading.Event()
+
+        self.http_server = ThreadingHTTPServer((host, http_port), self.make_handler())
+        self.http_server.daemon_threads = True
+        self.stream_server = socket.create_server((host, tcp_port))
+
+    @property
+    def http_port(self):
+        return self.http_server.server_address[1]
+
+    @property
+    def tcp_port(self):
+        return self.stream_server.getsockname()[1]
+
+    @property
+    def url(self):
+        return "http://" + self.host + ":" + str(self.http_port)
+
+    def start(self):
+        self.running.set()
+        threading.Thread(target=self.http_server.serve_forever, name="StandInHttp", daemon=True).start()
+        threading.Thread(target=self.accept_stream_connections, name="StandInStreamAccept", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running.clear()
+        self.http_server.shutdown()
+        self.http_server.server_close()
+        self.stream_server.close()
+        self.disconnect_clients()
+
+    # Close all data stream connections, which looks like a network failure to the clients.
+    def disconnect_clients(self):
+        with self.lock:
+            connections, self.stream_connections = self.stream_connections, []
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+
+    # Replace the channels of the data stream, the new layout is used for the frames sent from now on.
+    def set_channels(self, channels):
+        self.channels = list(channels)
+        self.template = PayloadTemplate(self.channels, self.frame_duration)
+
+    def accept_stream_connections(self):
+        while self.running.is_set():
+            try:
+                connection, _ = self.stream_server.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.stream_connections.append(connection)
+            threading.Thread(target=self.send_frames, args=(connection,), name="StandInStream", daemon=True).start()
+
+    # Send frames until the client disconnects. The sequence number is shared between connections,
+    # so a client that reconnects continues where the stream is, just like with a real controller.
+    def send_frames(self, connection):
+        start_time = time.monotonic()
+        frame_count = 0
+        template = None
+        try:
+            while self.running.is_set():
+                with self.lock:
+                    sequence_number = self.sequence_number
+                    self.sequence_number += 1
+                if template is not self.template:
+                    template = self.template
+                    payloads = [bytearray(payload) for payload in template.payloads]
+                variant = template.variant(sequence_number)
+                payload = payloads[variant]
+                template.build(payload, variant, int(sequence_number * self.frame_duration * TICKS_PER_SECOND))
+                connection.sendall(header_struct.pack(sequence_number, time.time(), 0.0, len(payload), 0xfffe, 0))
+                connection.sendall(payload)
+
+                frame_count += 1
+                if self.realtime:
+                    delay = start_time + frame_count * self.frame_duration - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+    def find_item(self, item_id):
+        for item in self.items:
+            if item["ItemId"] == item_id:
+                return item
+        return None
+
+    # Handle a REST request, returning the status code and the JSON body.
+    def handle_request(self, method, path, query, body):
+        with self.lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if method == "GET" and path == "/info/ping/":
+            return 200, {"Code": 0, "Message": "QServer stand-in is online"}
+        if method == "GET" and path == "/item/list/":
+            return 200, self.items
+        if method == "GET" and path == "/datastream/setup/":
+            return 200, {"TCPPort": self.tcp_port}
+        if method == "PUT" and path == "/system/settings/apply":
+            with self.lock:
+                self.apply_count += 1
+                for document in list(self.operation_modes.values()) + list(self.settings.values()):
+                    document["SettingsApplied"] = True
+            return 200, {"Code": 0, "Message": "Settings applied"}
+
+        if path in ("/item/operationMode/", "/item/settings/"):
+            documents = self.operation_modes if path == "/item/operationMode/" else self.settings
+            try:
+                item_id = int(query["itemId"][0])
+            except (KeyError, ValueError):
+                return 400, {"Code": 1, "Message": "Missing itemId"}
+            if item_id not in documents:
+                return 404, {"Code": 2, "Message": "Unknown itemId"}
+
+            with self.lock:
+                if method == "GET":
+                    return 200, copy.deepcopy(documents[item_id])
+                if method == "PUT":
+                    document = json.loads(body)
+                    document["SettingsApplied"] = False
+                    documents[item_id] = document
+                    return 200, {"Code": 0, "Message": "Settings updated"}
+
+        return 404, {"Code": 3, "Message": "Unknown endpoint"}
+
+    def make_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # The headers and body are written separately, without this Nagle's algorithm delays every keep-alive response.
+            disable_nagle_algorithm = True
+
+            def handle_method(self, method):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length else b""
+                status_code, document = stand_in.handle_request(method, url.path, parse_qs(url.query), body)
+
+                response = json.dumps(document).encode()
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def do_GET(self):
+                self.handle_method("GET")
+
+            def do_PUT(self):
+                self.handle_method("PUT")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+if __name__ == "__main__":
+    stand_in = QServerStandIn(realtime=True, http_port=8080).start()
+    print("QServer stand-in serving on", stand_in.url, "with the data stream on port", stand_in.tcp_port)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stand_in.stop()
@@ -0,0 +1,181 @@
+# QServer introduction to Python: Streaming from many controllers in one process with asyncio.
+# The StreamData example uses blocking calls, hence every controller needs its own process.
+# This client uses asyncio streams for the HTTP requests as well as for the TCP data stream,
+# so a single event loop can stream from dozens of controllers at the same time.
+# Every controller has a bounded queue of decoded frames. When a consumer falls behind, the queue fills up and the
+# client stops reading from that socket until there is room again, which lets TCP flow control slow the sender down.
+
+import asyncio
+import json
+from FramePlan import FramePlanCache
+from StreamClient import BYTE_ORDER_MARKER, PAYLOAD_TYPE_DATA
+from StreamReceiver import HEADER_SIZE, StreamHeader, header_struct
+
+# Put on the queue when QServer closed the connection between two frames, which ends the iteration.
+END_OF_STREAM = object()
+
+
+class AsyncStreamClient:
+    def __init__(self, ip, port=8080, queue_size=16):
+        self.ip = ip
+        self.port = port
+        self.queue_size = queue_size
+        self.writer = None
+        self.reader_task = None
+        self.frames = None
+        self.plan_cache = FramePlanCache()
+
+    # A minimal HTTP GET request, returning the status code and the decoded JSON body (None if the body is empty).
+    async def get(self, path):
+        reader, writer = await asyncio.open_connection(self.ip, self.port)
+        try:
+            request = "GET " + path + " HTTP/1.1\r\nHost: " + self.ip + "\r\nConnection: close\r\n\r\n"
+            writer.write(request.encode('ascii'))
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+        head, _, body = response.partition(b"\r\n\r\n")
+        status_code = int(head.split(b" ", 2)[1])
+        if b"transfer-encoding: chunked" in head.lower():
+            body = decode_chunked(body)
+        return status_code, json.loads(body) if body.strip() else None
+
+    # Check if the system is online by sending a /info/ping/ request.
+    async def ping(self):
+        status_code, _ = await self.get("/info/ping/")
+        return status_code == 200
+
+    # Request the port which is available for streaming.
+    async def request_streaming_port(self):
+        status_code, datastream_setup = await self.get("/datastream/setup/")
+        if status_code != 200:
+            raise ConnectionError("Failed to receive datastream setup from " + self.ip)
+        return datastream_setup["TCPPort"]
+
+    async def connect(self):
+        if not await self.ping():
+            raise ConnectionError("Server " + self.ip + " is offline")
+
+        streaming_port = await self.request_streaming_port()
+        stream_reader, self.writer = await asyncio.open_connection(self.ip, streaming_port)
+        self.frames = asyncio.Queue(self.queue_size)
+        self.reader_task = asyncio.create_task(self.read_frames(stream_reader))
+
+    # Read and decode frames until the connection closes, the queue provides the backpressure.
+    # When the reader stops, the exception is put on the queue so the consumer sees why the stream ended.
+    # Only a connection closed between two frames ends the stream normally; a frame cut off halfway, or a reset
+    # connection, is an error.
+    async def read_frames(self, stream_reader):
+        try:
+            while True:
+                try:
+                    header_data = await stream_reader.readexactly(HEADER_SIZE)
+                except asyncio.IncompleteReadError as error:
+                    if error.partial:
+                        raise
+                    await self.frames.put(END_OF_STREAM)
+                    return
+                header = StreamHeader._make(header_struct.unpack(header_data))
+                payload = await stream_reader.readexactly(header.payload_size)
+                if header.payload_type != PAYLOAD_TYPE_DATA:
+                    continue
+
+                if header.byte_order_marker != BYTE_ORDER_MARKER:
+                    raise ValueError("Unknown byte order marker: " + hex(header.byte_order_marker))
+
+                await self.frames.put(self.plan_cache.decode(header, payload))
+        except asyncio.IncompleteReadError:
+            await self.frames.put(ConnectionError("Connection to " + self.ip + " closed in the middle of a frame"))
+        except Exception as error:
+            await self.frames.put(error)
+
+    async def close(self):
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+            try:
+                await self.reader_task
+            except asyncio.CancelledError:
+                pass
+            self.reader_task = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    # Iterate over the decoded data frames of this controller.
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        frame = await self.frames.get()
+        if frame is END_OF_STREAM:
+            raise StopAsyncIteration
+        if isinstance(frame, Exception):
+            raise frame
+        return frame
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+# QServer may answer with a chunked body, in which case the chunks have to be joined.
+def decode_chunked(body):
+    data = b""
+    while body:
+        size_line, _, body = body.partition(b"\r\n")
+        size = int(size_line.split(b";")[0], 16)
+        if size == 0:
+            break
+        data += body[:size]
+        body = body[size + 2:]
+    return data
+
+
+# Stream from several controllers at once, yielding (client, frame) tuples as the frames arrive.
+# The controllers are given as IP addresses, or as (ip, port) tuples when they do not use the default port.
+# The merged queue is bounded as well, hence a slow consumer slows every controller down instead of using more memory.
+async def stream_controllers(controllers, queue_size=16):
+    clients = []
+    for controller in controllers:
+        ip, port = controller if isinstance(controller, tuple) else (controller, 8080)
+        clients.append(AsyncStreamClient(ip, port, queue_size))
+    merged = asyncio.Queue(queue_size * len(clients))
+
+    # Every forwarding task ends by putting None, or the exception that stopped it, on the merged queue.
+    async def forward(client):
+        try:
+            async for frame in client:
+                await merged.put((client, frame))
+        except Exception as error:
+            await merged.put(error)
+        else:
+            await merged.put(None)
+
+    tasks = []
+    try:
+        # Wait for every connection attempt, so the clients that did connect are closed as well when one fails.
+        results = await asyncio.gather(*(client.connect() for client in clients), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        tasks = [asyncio.create_task(forward(client)) for client in clients]
+
+        remaining = len(tasks)
+        while remaining:
+            item = await merged.get()
+            if item is None:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*(client.close() for client in clients))
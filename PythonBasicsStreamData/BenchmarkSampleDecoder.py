@@ -0,0 +1,78 @@
+# QServer introduction to Python: Benchmark the vectorized SampleDecoder against the per-sample decoding.
+# This script does not need a controller, it generates random channel blocks for every analog SampleType.
+# For each SampleType it checks that both implementations return the same values, then reports the samples per second.
+
+import struct
+import time
+from ctypes import c_int32
+import numpy as np
+from SampleDecoder import decode_analog_block
+
+sample_count = 100000
+repeat_count = 5
+
+
+# These are the per-sample implementations used by the original StreamData example.
+# The example used ctypes.c_long for the 24-bit data, which is only 32 bits wide on Windows.
+# Hence c_int32 is used here, so the sign is extended on every platform.
+def legacy_decode(sample_type, data, channel_data_size):
+    if sample_type == 0:
+        return struct.unpack('f' * (channel_data_size // 4), data[0:channel_data_size])
+
+    scaling_factor = struct.unpack('f', data[0:4])[0]
+    specific_data = data[4:4 + channel_data_size]
+
+    if sample_type == 1:
+        return [scaling_factor * struct.unpack('h', specific_data[i:i + 2])[0] for i in range(0, len(specific_data), 2)]
+    elif sample_type == 2:
+        sampled_data = []
+        for i in range(0, len(specific_data), 3):
+            value = c_int32((specific_data[i + 2] << 24) | (specific_data[i + 1] << 16) | (specific_data[i] << 8))
+            sampled_data.append(scaling_factor * float(value.value))
+        return sampled_data
+    else:
+        return [scaling_factor * struct.unpack('i', specific_data[i:i + 4])[0] for i in range(0, len(specific_data), 4)]
+
+
+# Build a channel block the way QServer delivers it: the scaling factor (for raw data) followed by the samples.
+def build_block(sample_type, rng):
+    if sample_type == 0:
+        data = rng.standard_normal(sample_count).astype('<f4').tobytes()
+        return data, len(data)
+
+    if sample_type == 1:
+        data = rng.integers(-2 ** 15, 2 ** 15, sample_count, dtype=np.int64).astype('<i2').tobytes()
+    elif sample_type == 2:
+        data = rng.integers(0, 256, sample_count * 3, dtype=np.int64).astype(np.uint8).tobytes()
+    else:
+        data = rng.integers(-2 ** 31, 2 ** 31, sample_count, dtype=np.int64).astype('<i4').tobytes()
+
+    return struct.pack('f', 1.0 / 2 ** 23) + data, len(data)
+
+
+# Return the best time of a few runs, which is the least affected by other processes on the machine.
+def best_time(function):
+    best = None
+    for _ in range(repeat_count):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+rng = np.random.default_rng(42)
+print("{:<12}{:>18}{:>18}{:>10}".format("SampleType", "Per-sample [S/s]", "Vectorized [S/s]", "Speedup"))
+for sample_type in range(4):
+    block, channel_data_size = build_block(sample_type, rng)
+
+    expected = legacy_decode(sample_type, block, channel_data_size)
+    decoded, scaling_factor, consumed_size = decode_analog_block(sample_type, memoryview(block), channel_data_size)
+    if consumed_size != len(block) or not np.array_equal(np.asarray(expected), decoded):
+        print("SampleType", sample_type, "does not match the per-sample decoding")
+        exit()
+
+    legacy_time = best_time(lambda: legacy_decode(sample_type, block, channel_data_size))
+    vectorized_time = best_time(lambda: decode_analog_block(sample_type, memoryview(block), channel_data_size))
+    print("{:<12}{:>18,.0f}{:>18,.0f}{:>9.1f}x".format(sample_type, sample_count / legacy_time, sample_count / vectorized_time, legacy_time / vectorized_time))
@@ -0,0 +1,79 @@
+# QServer introduction to Python: Decoding CAN Bus messages in a batch.
+# The CAN Channel Data is a list of messages with a variable length, each message contains the following fields:
+# - Timestamp: The timestamp of the message; 64-bit floating point
+# - ID: The identifier of the message; 32-bit unsigned integer
+# - Header: The header of the message; 8-bit unsigned integer
+# - Frame Format: The frame format of the message; 8-bit unsigned integer
+# - Frame Type: The frame type of the message; 8-bit unsigned integer
+# - DLC: The data length code of the message; 8-bit unsigned integer
+# - Data: The data of the message; DLC bytes, up to 64 bytes
+# Building a dictionary per message is slow on a busy bus. This module only walks the DLC fields in Python to find where
+# every message starts, then gathers all the fields at once with NumPy into a structured array with one row per message.
+# Messages can be filtered by ID, in which case the rows of the other messages are never built.
+
+import numpy as np
+
+MESSAGE_HEADER_SIZE = 16
+MAX_DATA_SIZE = 64
+
+# The fixed size part of a message, as it is laid out in the payload.
+message_header_dtype = np.dtype([("timestamp", "<f8"), ("id", "<u4"), ("header", "u1"), ("frame_format", "u1"), ("frame_type", "u1"), ("dlc", "u1")])
+
+# A decoded message. The data holds the DLC bytes of the message followed by zeros,
+# the data offset is the position of the data in the Channel Data block.
+can_message_dtype = np.dtype([("timestamp", "<f8"), ("id", "<u4"), ("header", "u1"), ("frame_format", "u1"), ("frame_type", "u1"),
+                              ("dlc", "u1"), ("data_offset", "<u4"), ("data", "u1", (MAX_DATA_SIZE,))])
+
+data_positions = np.arange(MAX_DATA_SIZE)
+header_positions = np.arange(MESSAGE_HEADER_SIZE)
+
+
+# Find the offset of every message in the Channel Data block.
+# This is the only part that has to loop over the messages, since every message starts after the data of the previous one.
+# A message which does not fit in the block means the block is truncated or corrupt, which raises a ValueError.
+def message_offsets(raw):
+    offsets = []
+    index = 0
+    size = len(raw)
+    while index < size:
+        if index + MESSAGE_HEADER_SIZE > size or index + MESSAGE_HEADER_SIZE + raw[index + 15] > size:
+            raise ValueError("CAN message at offset " + str(index) + " exceeds the Channel Data")
+        offsets.append(index)
+        index += MESSAGE_HEADER_SIZE + raw[index + 15]
+    return np.array(offsets, dtype=np.int64)
+
+
+# Convert a collection of message IDs into the sorted array decode_can_messages uses to filter messages.
+# Do this once up front, rather than for every packet.
+def make_id_filter(message_ids):
+    return np.unique(np.asarray(list(message_ids), dtype=np.uint32))
+
+
+# Decode the CAN Channel Data (following the 24-byte CAN Bus Channel Header) into a structured array of messages.
+# The allowed IDs are an optional filter from make_id_filter, only messages with these IDs are decoded.
+def decode_can_messages(data, allowed_ids=None):
+    raw = np.frombuffer(data, dtype=np.uint8)
+    offsets = message_offsets(memoryview(data).cast("B"))
+
+    if allowed_ids is not None and len(offsets):
+        ids = raw[(offsets + 8)[:, None] + np.arange(4)].copy().view("<u4").reshape(len(offsets))
+        offsets = offsets[np.isin(ids, allowed_ids)]
+
+    messages = np.zeros(len(offsets), dtype=can_message_dtype)
+    if not len(offsets):
+        return messages
+
+    headers = raw[offsets[:, None] + header_positions].copy().view(message_header_dtype).reshape(len(offsets))
+    for field in message_header_dtype.names:
+        messages[field] = headers[field]
+
+    data_offsets = offsets + MESSAGE_HEADER_SIZE
+    messages["data_offset"] = data_offsets
+
+    # Gather up to 64 bytes per message and clear the bytes beyond the DLC of each message.
+    # The last messages may end less than 64 bytes before the end of the block, their positions are clipped to the block.
+    positions = np.minimum(data_offsets[:, None] + data_positions, len(raw) - 1)
+    data_bytes = raw[positions]
+    data_bytes[data_positions >= headers["dlc"][:, None]] = 0
+    messages["data"] = data_bytes
+    return messages
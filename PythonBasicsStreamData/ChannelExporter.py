@@ -0,0 +1,219 @@
+# QServer introduction to Python: Exporting decoded channel data in chunks.
+# Rather than saving all the data at the end of a run, the exporter writes every channel to its own append-only series of
+# chunk files while the stream is running. Every chunk holds the samples and their timestamps as separate columns,
+# either as .npy files or, when pyarrow is installed, as record batches in an Arrow IPC stream per channel.
+# An Arrow stream has a single schema, hence a channel starts a new stream file when its data type changes, e.g. when
+# the SampleType changes from 32-bit floating point to raw data.
+# A small manifest records the ChannelId, SampleType, scaling factor and time range of every chunk. Readers use it to
+# memory-map only the chunks of the channel and time range they need, without loading the rest of the export.
+
+import json
+import os
+import numpy as np
+from ChannelRingBuffer import sample_timestamps
+from FramePlan import CHANNEL_TYPE_ANALOG, CHANNEL_TYPE_COUNTER
+
+# pyarrow is optional, without it the chunks are written as .npy files.
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+MANIFEST_FILE_NAME = "manifest.json"
+FORMAT_NPY = "npy"
+FORMAT_ARROW = "arrow"
+
+
+def channel_directory(directory, channel_id):
+    return os.path.join(directory, "channel_" + str(channel_id))
+
+
+# The samples of a channel that have not been written yet.
+class PendingChunk:
+    def __init__(self, sample_type, scaling_factor):
+        self.sample_type = sample_type
+        self.scaling_factor = scaling_factor
+        self.samples = []
+        self.timestamps = []
+        self.sample_count = 0
+
+
+class ChannelExporter:
+    # A chunk is written once a channel has collected the chunk size in samples.
+    # The sample rates and ticks per second are used to give every sample its own timestamp, like the ChannelStore does.
+    # Integer timestamps, such as the Timestamp of the Generic Channel Header, are exported as int64 ticks.
+    def __init__(self, directory, chunk_size=1000000, sample_rates=None, ticks_per_second=1.0, file_format=None):
+        if file_format is None:
+            file_format = FORMAT_ARROW if pyarrow is not None else FORMAT_NPY
+        if file_format == FORMAT_ARROW and pyarrow is None:
+            raise ImportError("pyarrow is required for the Arrow format")
+        if file_format not in (FORMAT_NPY, FORMAT_ARROW):
+            raise ValueError("Unknown export format: " + str(file_format))
+
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.sample_rates = sample_rates or {}
+        self.ticks_per_second = ticks_per_second
+        self.file_format = file_format
+        os.makedirs(directory, exist_ok=True)
+
+        self.pending = {}
+        self.chunk_counts = {}
+        # Per channel the open Arrow stream as [writer, file name, batch count, schema], and the number of stream files.
+        self.arrow_writers = {}
+        self.stream_counts = {}
+        self.manifest = {"Format": file_format, "Chunks": []}
+
+    def add(self, channel_id, samples, timestamp, sample_type=0, scaling_factor=None):
+        samples = np.asarray(samples)
+        sample_rate = self.sample_rates.get(channel_id)
+        sample_period = self.ticks_per_second / sample_rate if sample_rate else 0.0
+        timestamps = sample_timestamps(timestamp, np.arange(len(samples)) * sample_period)
+
+        # Every chunk has a single SampleType and scaling factor, hence a change starts a new chunk.
+        chunk = self.pending.get(channel_id)
+        if chunk is not None and (chunk.sample_type != sample_type or chunk.scaling_factor != scaling_factor):
+            self.write_chunk(channel_id)
+            chunk = None
+        if chunk is None:
+            chunk = self.pending[channel_id] = PendingChunk(sample_type, scaling_factor)
+
+        chunk.samples.append(samples)
+        chunk.timestamps.append(timestamps)
+        chunk.sample_count += len(samples)
+        if chunk.sample_count >= self.chunk_size:
+            self.write_chunk(channel_id)
+
+    # Add the Analog and Counter Channels of a DecodedFrame.
+    def add_frame(self, frame):
+        for channel in frame.channels:
+            if channel.channel_type in (CHANNEL_TYPE_ANALOG, CHANNEL_TYPE_COUNTER):
+                self.add(channel.channel_id, channel.data, channel.timestamp, channel.sample_type, channel.scaling_factor)
+
+    def write_chunk(self, channel_id):
+        chunk = self.pending.pop(channel_id, None)
+        if chunk is None or chunk.sample_count == 0:
+            return
+
+        samples = np.concatenate(chunk.samples)
+        timestamps = np.concatenate(chunk.timestamps)
+        chunk_number = self.chunk_counts.get(channel_id, 0)
+        self.chunk_counts[channel_id] = chunk_number + 1
+
+        path = channel_directory(self.directory, channel_id)
+        os.makedirs(path, exist_ok=True)
+        entry = {
+            "ChannelId": channel_id,
+            "SampleType": chunk.sample_type,
+            "ScalingFactor": chunk.scaling_factor,
+            "Chunk": chunk_number,
+            "SampleCount": len(samples),
+            "FirstTimestamp": timestamps[0].item(),
+            "LastTimestamp": timestamps[-1].item(),
+        }
+
+        if self.file_format == FORMAT_NPY:
+            name = "chunk_{:05d}".format(chunk_number)
+            np.save(os.path.join(path, name + "_samples.npy"), samples)
+            np.save(os.path.join(path, name + "_timestamps.npy"), timestamps)
+            entry["File"] = name
+        else:
+            batch = pyarrow.record_batch([pyarrow.array(samples), pyarrow.array(timestamps)], names=["samples", "timestamps"])
+            stream = self.arrow_writers.get(channel_id)
+            if stream is not None and not stream[3].equals(batch.schema):
+                stream[0].close()
+                stream = None
+            if stream is None:
+                file_number = self.stream_counts.get(channel_id, 0)
+                self.stream_counts[channel_id] = file_number + 1
+                name = "stream_{:05d}.arrows".format(file_number)
+                stream = self.arrow_writers[channel_id] = [pyarrow.ipc.new_stream(os.path.join(path, name), batch.schema), name, 0, batch.schema]
+            stream[0].write_batch(batch)
+            entry["File"] = stream[1]
+            entry["Batch"] = stream[2]
+            stream[2] += 1
+
+        self.manifest["Chunks"].append(entry)
+        self.write_manifest()
+
+    # The manifest is replaced in one step, hence a reader never sees a partially written manifest.
+    def write_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_FILE_NAME)
+        with open(path + ".tmp", "w") as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=4)
+        os.replace(path + ".tmp", path)
+
+    # Write the remaining samples of every channel.
+    def flush(self):
+        for channel_id in list(self.pending):
+            self.write_chunk(channel_id)
+
+    def close(self):
+        self.flush()
+        for stream in self.arrow_writers.values():
+            stream[0].close()
+        self.arrow_writers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ChannelReader:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE_NAME)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+
+    def channel_ids(self):
+        return sorted({entry["ChannelId"] for entry in self.manifest["Chunks"]})
+
+    def chunks(self, channel_id):
+        return [entry for entry in self.manifest["Chunks"] if entry["ChannelId"] == channel_id]
+
+    # Memory-map the chunks of a channel; returns a list of (manifest entry, samples, timestamps).
+    def load_chunks(self, chunks):
+        if not chunks:
+            return []
+        path = channel_directory(self.directory, chunks[0]["ChannelId"])
+        if self.manifest["Format"] == FORMAT_NPY:
+            return [(entry,
+                     np.load(os.path.join(path, entry["File"] + "_samples.npy"), mmap_mode="r"),
+                     np.load(os.path.join(path, entry["File"] + "_timestamps.npy"), mmap_mode="r")) for entry in chunks]
+
+        if pyarrow is None:
+            raise ImportError("pyarrow is required to read the Arrow format")
+
+        # The batches of an Arrow IPC stream can only be reached in order, but reading them from a memory map does not copy.
+        loaded = []
+        for name in sorted({entry["File"] for entry in chunks}):
+            wanted = {entry["Batch"]: entry for entry in chunks if entry["File"] == name}
+            with pyarrow.ipc.open_stream(pyarrow.memory_map(os.path.join(path, name))) as reader:
+                for batch_number, batch in enumerate(reader):
+                    if batch_number in wanted:
+                        loaded.append((wanted[batch_number], batch.column(0).to_numpy(), batch.column(1).to_numpy()))
+                    if batch_number >= max(wanted):
+                        break
+        loaded.sort(key=lambda chunk: chunk[0]["Chunk"])
+        return loaded
+
+    # Read the samples and timestamps of a channel, optionally limited to the timestamps in [t0, t1).
+    # Only the chunks overlapping the time range are mapped, and only the selected part of those is copied.
+    def read(self, channel_id, t0=None, t1=None):
+        chunks = [entry for entry in self.chunks(channel_id)
+                  if (t0 is None or entry["LastTimestamp"] >= t0) and (t1 is None or entry["FirstTimestamp"] < t1)]
+
+        samples = []
+        timestamps = []
+        for entry, chunk_samples, chunk_timestamps in self.load_chunks(chunks):
+            first = 0 if t0 is None else int(np.searchsorted(chunk_timestamps, t0))
+            last = len(chunk_timestamps) if t1 is None else int(np.searchsorted(chunk_timestamps, t1))
+            samples.append(chunk_samples[first:last])
+            timestamps.append(chunk_timestamps[first:last])
+
+        if not samples:
+            return np.zeros(0), np.zeros(0)
+        return np.concatenate(samples), np.concatenate(timestamps)
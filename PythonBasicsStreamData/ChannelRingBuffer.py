@@ -0,0 +1,188 @@
+# QServer introduction to Python: Storing channel data in bounded ring buffers.
+# Appending every packet to a list keeps all the data in memory as Python objects, which grows without limit.
+# A ring buffer preallocates a NumPy array for a fixed number of samples and overwrites the oldest samples once it is full,
+# so a stream can run for hours in constant memory. Every sample also gets a timestamp in a parallel array,
+# which makes it possible to select the samples of a time window.
+# The Timestamp of the Generic Channel Header is a 64-bit integer, in nanoseconds since the epoch. A float64 can only
+# resolve such a timestamp to about 256 ns, hence integer timestamps are kept as int64, rounded to the nearest tick.
+
+import threading
+import numpy as np
+from FramePlan import CHANNEL_TYPE_ANALOG, CHANNEL_TYPE_COUNTER
+
+# What to do when samples are appended to a full buffer:
+# - overwrite: Drop the oldest samples to make room for the new ones.
+# - block: Wait until a consumer drains the buffer, raising a BufferError if that takes longer than the timeout.
+OVERFLOW_OVERWRITE = "overwrite"
+OVERFLOW_BLOCK = "block"
+
+
+# The timestamps of the samples at the given offsets from the block timestamp, in ticks.
+# Integer block timestamps give int64 timestamps, rounded to the nearest tick; other timestamps give float64 timestamps.
+def sample_timestamps(timestamp, offsets):
+    if isinstance(timestamp, (int, np.integer)):
+        return np.int64(timestamp) + np.rint(offsets).astype(np.int64)
+    return timestamp + offsets
+
+
+class ChannelRingBuffer:
+    # The capacity is the number of samples kept. Use from_duration to specify it in seconds instead.
+    # The sample period is the time between two samples, in the same unit as the block timestamps.
+    # It is used to give every sample of a block its own timestamp; with a period of 0 all samples get the block timestamp.
+    # The timestamps are stored as int64 when the first block has an integer timestamp, otherwise as float64.
+    def __init__(self, capacity, dtype=np.float64, sample_period=0.0, overflow=OVERFLOW_OVERWRITE, timeout=None):
+        if overflow not in (OVERFLOW_OVERWRITE, OVERFLOW_BLOCK):
+            raise ValueError("Unknown overflow policy: " + str(overflow))
+
+        self.capacity = int(capacity)
+        self.samples = np.zeros(self.capacity, dtype=dtype)
+        self.timestamps = None
+        self.sample_period = sample_period
+        self.overflow = overflow
+        self.timeout = timeout
+
+        # The buffer holds the samples in [start, start + count), wrapping around at the capacity.
+        self.start = 0
+        self.count = 0
+        self.dropped = 0
+        self.condition = threading.Condition()
+
+    @classmethod
+    def from_duration(cls, seconds, sample_rate, **kwargs):
+        return cls(int(np.ceil(seconds * sample_rate)), sample_period=kwargs.pop("sample_period", 1.0 / sample_rate), **kwargs)
+
+    def __len__(self):
+        return self.count
+
+    # Copy the values into the buffer starting at the given logical position, wrapping around if needed.
+    def write(self, array, position, values):
+        first = min(len(values), self.capacity - position)
+        array[position:position + first] = values[:first]
+        array[:len(values) - first] = values[first:]
+
+    def append(self, samples, timestamp):
+        samples = np.asarray(samples)
+        sample_count = len(samples)
+        timestamps = sample_timestamps(timestamp, np.arange(sample_count) * self.sample_period)
+
+        # Only the newest samples fit if a single block is larger than the buffer.
+        if sample_count > self.capacity:
+            self.dropped += sample_count - self.capacity
+            samples = samples[-self.capacity:]
+            timestamps = timestamps[-self.capacity:]
+            sample_count = self.capacity
+
+        with self.condition:
+            if self.timestamps is None:
+                self.timestamps = np.zeros(self.capacity, dtype=timestamps.dtype)
+            free = self.capacity - self.count
+            if sample_count > free:
+                if self.overflow == OVERFLOW_BLOCK:
+                    if not self.condition.wait_for(lambda: self.capacity - self.count >= sample_count, self.timeout):
+                        raise BufferError("Ring buffer is full")
+                else:
+                    overwritten = sample_count - free
+                    self.start = (self.start + overwritten) % self.capacity
+                    self.count -= overwritten
+                    self.dropped += overwritten
+
+            end = (self.start + self.count) % self.capacity
+            self.write(self.samples, end, samples)
+            self.write(self.timestamps, end, timestamps)
+            self.count += sample_count
+
+    # Return the samples and timestamps at logical positions [first, last) of the buffer.
+    # This is a view on the buffer when the range does not wrap around, otherwise the two parts are copied together.
+    # Views are overwritten by later appends, copy them if they need to be kept.
+    def slice(self, first, last):
+        if self.timestamps is None:
+            return self.samples[:0], np.zeros(0)
+        begin = (self.start + first) % self.capacity
+        size = last - first
+        if begin + size <= self.capacity:
+            return self.samples[begin:begin + size], self.timestamps[begin:begin + size]
+
+        wrapped = begin + size - self.capacity
+        return (np.concatenate((self.samples[begin:], self.samples[:wrapped])),
+                np.concatenate((self.timestamps[begin:], self.timestamps[:wrapped])))
+
+    # The newest n samples and their timestamps.
+    def latest(self, n):
+        with self.condition:
+            n = min(n, self.count)
+            return self.slice(self.count - n, self.count)
+
+    # The samples with timestamps in [t0, t1). The timestamps increase along the buffer, hence a binary search is used.
+    def window(self, t0, t1):
+        with self.condition:
+            first = self.search(t0)
+            last = self.search(t1)
+            return self.slice(first, last)
+
+    # The logical position of the first sample with a timestamp of at least the given time.
+    def search(self, time):
+        if self.timestamps is None:
+            return 0
+        tail = min(self.count, self.capacity - self.start)
+        position = int(np.searchsorted(self.timestamps[self.start:self.start + tail], time))
+        if position == tail and tail < self.count:
+            position += int(np.searchsorted(self.timestamps[:self.count - tail], time))
+        return position
+
+    # Remove and return all samples in the buffer; the arrays are copies, since the space is reused right away.
+    def drain(self):
+        with self.condition:
+            samples, timestamps = self.slice(0, self.count)
+            samples, timestamps = samples.copy(), timestamps.copy()
+            self.start = 0
+            self.count = 0
+            self.condition.notify_all()
+            return samples, timestamps
+
+
+# A ring buffer for every channel, created on the first block of a channel.
+# The sample rates are optional, when given the buffer size can be specified in seconds and every sample gets its own timestamp.
+# The ticks per second convert the sample rate to the unit of the Timestamp field, e.g. 1e9 for nanosecond timestamps.
+# The overflow and timeout are passed on to every buffer; with the block overflow the timeout bounds the wait in seconds.
+class ChannelStore:
+    def __init__(self, capacity=None, seconds=None, sample_rates=None, ticks_per_second=1.0, dtype=np.float64, overflow=OVERFLOW_OVERWRITE,
+                 timeout=None):
+        if capacity is None and seconds is None:
+            raise ValueError("Specify the capacity in samples or in seconds")
+
+        self.capacity = capacity
+        self.seconds = seconds
+        self.sample_rates = sample_rates or {}
+        self.ticks_per_second = ticks_per_second
+        self.dtype = dtype
+        self.overflow = overflow
+        self.timeout = timeout
+        self.buffers = {}
+
+    def create_buffer(self, channel_id):
+        sample_rate = self.sample_rates.get(channel_id)
+        sample_period = self.ticks_per_second / sample_rate if sample_rate else 0.0
+        if self.seconds is not None and sample_rate is not None:
+            return ChannelRingBuffer.from_duration(self.seconds, sample_rate, dtype=self.dtype, sample_period=sample_period, overflow=self.overflow,
+                                                 timeout=self.timeout)
+        if self.capacity is None:
+            raise ValueError("No sample rate known for ChannelId " + str(channel_id) + ", hence the capacity must be given in samples")
+        return ChannelRingBuffer(self.capacity, self.dtype, sample_period, self.overflow, self.timeout)
+
+    def append(self, channel_id, samples, timestamp):
+        buffer = self.buffers.get(channel_id)
+        if buffer is None:
+            buffer = self.buffers[channel_id] = self.create_buffer(channel_id)
+        buffer.append(samples, timestamp)
+
+    # Store the numeric channels of a DecodedFrame; CAN and GPS data are not sample arrays and are skipped.
+    def append_frame(self, frame):
+        for channel in frame.channels:
+            if channel.channel_type in (CHANNEL_TYPE_ANALOG, CHANNEL_TYPE_COUNTER):
+                self.append(channel.channel_id, channel.data, channel.timestamp)
+
+    def __getitem__(self, channel_id):
+        return self.buffers[channel_id]
+
+    def __contains__(self, channel_id):
+        return channel_id in self.buffers
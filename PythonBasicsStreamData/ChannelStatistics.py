@@ -0,0 +1,148 @@
+# QServer introduction to Python: Reducing the data stream to statistics and decimated traces.
+# Dashboards usually only need block statistics and a trace with fewer samples, not every raw sample.
+# The StatisticsStage runs right after decoding and reduces every channel block as it arrives:
+# - RollingStatistics: min, max, mean and RMS over windows of a fixed number of samples.
+# - MinMaxDecimator: the min and max of every group of samples, which keeps the peaks visible in a plot.
+# - AntiAliasDecimator: a low-pass filtered trace at a lower sample rate, for analysis or a smooth plot.
+# Each block is processed with NumPy in one go. Samples that do not fill a complete window yet are carried to the next
+# block, hence the results do not depend on how the samples were split into packets.
+# The Analog Channel Header already holds the Level, Min and Max of every packet, header_statistics returns those
+# without touching the samples at all.
+
+from collections import namedtuple
+import numpy as np
+from ChannelRingBuffer import sample_timestamps
+from FramePlan import CHANNEL_TYPE_ANALOG, CHANNEL_TYPE_COUNTER
+
+# The result of a reduction: the values per window or group, and the timestamp of the first sample of each.
+WindowStatistics = namedtuple("WindowStatistics", ["timestamps", "minimum", "maximum", "mean", "rms"])
+MinMaxTrace = namedtuple("MinMaxTrace", ["timestamps", "minimum", "maximum"])
+DecimatedTrace = namedtuple("DecimatedTrace", ["timestamps", "samples"])
+
+
+# Carries the samples which did not fill a complete window, together with the timestamp of the first of them.
+# That timestamp is kept as the timestamp of a block plus an offset in ticks, so an integer block timestamp stays exact.
+class BlockCarry:
+    def __init__(self, window_size, sample_period):
+        self.window_size = window_size
+        self.sample_period = sample_period
+        self.pending = np.zeros(0)
+        self.pending_time = None
+        self.pending_offset = 0.0
+
+    # Return the complete windows as a 2D array with one row per window, and the timestamp of every window.
+    def windows(self, samples, timestamp):
+        if self.pending_time is None or not len(self.pending):
+            self.pending_time = timestamp
+            self.pending_offset = 0.0
+        block_size = len(samples)
+        samples = np.concatenate((self.pending, samples)) if len(self.pending) else np.asarray(samples, dtype=np.float64)
+
+        window_count = len(samples) // self.window_size
+        used = window_count * self.window_size
+        windows = samples[:used].reshape(window_count, self.window_size)
+        timestamps = sample_timestamps(self.pending_time, self.pending_offset + np.arange(window_count) * self.window_size * self.sample_period)
+
+        self.pending = samples[used:].copy()
+        if window_count:
+            # The samples carried over are the tail of this block, their offset is taken from the timestamp of this block.
+            self.pending_time = timestamp
+            self.pending_offset = (block_size - len(self.pending)) * self.sample_period
+        return windows, timestamps
+
+
+class RollingStatistics:
+    def __init__(self, window_size, sample_period=0.0):
+        self.carry = BlockCarry(window_size, sample_period)
+
+    def process(self, samples, timestamp):
+        windows, timestamps = self.carry.windows(samples, timestamp)
+        return WindowStatistics(timestamps, windows.min(axis=1, initial=np.inf), windows.max(axis=1, initial=-np.inf),
+                                windows.mean(axis=1) if len(windows) else np.zeros(0),
+                                np.sqrt(np.mean(windows * windows, axis=1)) if len(windows) else np.zeros(0))
+
+
+class MinMaxDecimator:
+    def __init__(self, factor, sample_period=0.0):
+        self.carry = BlockCarry(factor, sample_period)
+
+    def process(self, samples, timestamp):
+        groups, timestamps = self.carry.windows(samples, timestamp)
+        return MinMaxTrace(timestamps, groups.min(axis=1, initial=np.inf), groups.max(axis=1, initial=-np.inf))
+
+
+# A windowed-sinc low-pass filter with the cutoff just below the Nyquist frequency of the decimated rate.
+def design_low_pass(factor, taps_per_factor=8):
+    tap_count = taps_per_factor * factor + 1
+    cutoff = 0.9 / factor
+    positions = np.arange(tap_count) - (tap_count - 1) / 2.0
+    taps = cutoff * np.sinc(cutoff * positions) * np.blackman(tap_count)
+    return taps / taps.sum()
+
+
+class AntiAliasDecimator:
+    # The filter history (the last samples of the previous block) is carried across blocks, as is the position
+    # of the next output sample, hence the output is the same as filtering the whole stream at once.
+    # The history starts at zero, hence the first outputs include the settling of the filter.
+    def __init__(self, factor, sample_period=0.0, taps=None):
+        self.factor = factor
+        self.sample_period = sample_period
+        self.taps = design_low_pass(factor) if taps is None else np.asarray(taps, dtype=np.float64)
+        self.history = np.zeros(len(self.taps) - 1)
+        self.phase = 0
+        self.delay = (len(self.taps) - 1) / 2.0
+
+    def process(self, samples, timestamp):
+        samples = np.asarray(samples, dtype=np.float64)
+        filtered = np.convolve(np.concatenate((self.history, samples)), self.taps, mode="valid")
+        indices = np.arange(self.phase, len(filtered), self.factor)
+
+        # The filter delays the signal by half its length, which is corrected in the timestamps.
+        timestamps = sample_timestamps(timestamp, (indices - self.delay) * self.sample_period)
+        self.phase = int(indices[-1] + self.factor - len(filtered)) if len(indices) else self.phase - len(filtered)
+        self.history = np.concatenate((self.history, samples))[-(len(self.taps) - 1):] if len(self.taps) > 1 else self.history
+        return DecimatedTrace(timestamps, filtered[indices])
+
+
+# The Level, Min and Max fields of the Analog Channel Headers of a frame, per ChannelId.
+# This costs nothing extra, since the headers are decoded anyway.
+def header_statistics(frame):
+    return {channel.channel_id: (channel.header.level, channel.header.min_value, channel.header.max_value)
+            for channel in frame.channels if channel.channel_type == CHANNEL_TYPE_ANALOG}
+
+
+# Runs the reductions for every channel of the decoded frames.
+# The window size and decimation factors apply to all channels; leave one at None to skip that reduction.
+# The sample rates and ticks per second give every output its timestamp, like the ChannelStore does.
+class StatisticsStage:
+    def __init__(self, window_size=None, min_max_factor=None, decimation_factor=None, sample_rates=None, ticks_per_second=1.0):
+        self.window_size = window_size
+        self.min_max_factor = min_max_factor
+        self.decimation_factor = decimation_factor
+        self.sample_rates = sample_rates or {}
+        self.ticks_per_second = ticks_per_second
+        self.channels = {}
+
+    def create_channel(self, channel_id):
+        sample_rate = self.sample_rates.get(channel_id)
+        sample_period = self.ticks_per_second / sample_rate if sample_rate else 0.0
+        reducers = {}
+        if self.window_size:
+            reducers["Statistics"] = RollingStatistics(self.window_size, sample_period)
+        if self.min_max_factor:
+            reducers["MinMax"] = MinMaxDecimator(self.min_max_factor, sample_period)
+        if self.decimation_factor:
+            reducers["Decimated"] = AntiAliasDecimator(self.decimation_factor, sample_period)
+        return reducers
+
+    # Reduce a single block of samples; returns a dictionary with the result of every reduction.
+    def process(self, channel_id, samples, timestamp):
+        reducers = self.channels.get(channel_id)
+        if reducers is None:
+            reducers = self.channels[channel_id] = self.create_channel(channel_id)
+        return {name: reducer.process(samples, timestamp) for name, reducer in reducers.items()}
+
+    # Reduce the Analog and Counter Channels of a DecodedFrame; returns the results per ChannelId.
+    def process_frame(self, frame):
+        return {channel.channel_id: self.process(channel.channel_id, channel.data, channel.timestamp)
+                for channel in frame.channels if channel.channel_type in (CHANNEL_TYPE_ANALOG, CHANNEL_TYPE_COUNTER)}
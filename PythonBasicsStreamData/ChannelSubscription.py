@@ -0,0 +1,81 @@
+# QServer introduction to Python: Feeding several consumers from a single stream.
+# Consumers often only need a few of the streamed channels, e.g. a dashboard showing the Analog Channels of one Module
+# and a logger storing the CAN Channels. Each consumer subscribes with its own filter by ChannelId, ChannelType and/or
+# SampleType. The SubscriptionHub decodes every payload once, and only the channels at least one subscriber asked for;
+# of the other channels only the Generic Channel Header is read. Every subscriber then receives a DecodedFrame with
+# just its own channels.
+#
+# Usage:
+#     with StreamClient("192.168.100.47") as client:
+#         hub = SubscriptionHub(client)
+#         hub.subscribe(show_analog, channel_types=[CHANNEL_TYPE_ANALOG])
+#         hub.subscribe(store_can, channel_types=[CHANNEL_TYPE_CAN])
+#         hub.run()
+
+from FramePlan import ChannelFilter, DecodedFrame
+
+
+class Subscription:
+    def __init__(self, hub, channel_filter, callback):
+        self.hub = hub
+        self.channel_filter = channel_filter
+        self.callback = callback
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class SubscriptionHub:
+    # The hub takes over the channel filter of the client, it selects the channels of all subscriptions together.
+    def __init__(self, client):
+        self.client = client
+        self.subscriptions = []
+        self.plan = None
+        self.selections = []
+        self.decoded_count = 0
+        client.plan_cache.channel_filter = self.accepts
+        client.invalidate_plan()
+
+    # The callback is called with a DecodedFrame holding the selected channels, for every data frame.
+    def subscribe(self, callback, channel_ids=None, channel_types=None, sample_types=None):
+        subscription = Subscription(self, ChannelFilter(channel_ids, channel_types, sample_types), callback)
+        self.subscriptions.append(subscription)
+        self.client.invalidate_plan()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.remove(subscription)
+        self.client.invalidate_plan()
+
+    def accepts(self, channel_id, sample_type, channel_type):
+        return any(subscription.channel_filter(channel_id, sample_type, channel_type) for subscription in self.subscriptions)
+
+    # The positions of the channels of every subscription in the decoded frames, computed once per plan.
+    def update_selections(self, plan):
+        decoded = [channel for channel in plan.channels if channel.decoder is not None]
+        self.selections = [
+            [index for index, channel in enumerate(decoded)
+             if subscription.channel_filter(channel.channel_id, channel.sample_type, channel.channel_type)]
+            for subscription in self.subscriptions]
+        self.decoded_count = len(decoded)
+        self.plan = plan
+
+    # Hand a decoded frame to the subscribers.
+    def publish(self, frame):
+        plan = self.client.plan_cache.plan
+        if plan is not self.plan or len(self.selections) != len(self.subscriptions):
+            self.update_selections(plan)
+        # A channel which failed to decode is missing from the frame, then the channels are selected one by one.
+        complete = len(frame.channels) == self.decoded_count
+        for subscription, selection in zip(list(self.subscriptions), self.selections):
+            if complete:
+                channels = [frame.channels[index] for index in selection]
+            else:
+                channels = [channel for channel in frame.channels
+                            if subscription.channel_filter(channel.channel_id, channel.sample_type, channel.channel_type)]
+            subscription.callback(DecodedFrame(frame.header, channels))
+
+    # Read frames from the client and publish them, optionally stopping after the given number of frames.
+    def run(self, count=None):
+        for frame in self.client.frames(count):
+            self.publish(frame)
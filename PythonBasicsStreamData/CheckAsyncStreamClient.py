@@ -0,0 +1,167 @@
+# QServer introduction to Python: Check the AsyncStreamClient against several local stand-in servers.
+# This script does not need a controller, it streams from a few QServerStandIns in one event loop. It checks that:
+# - stream_controllers delivers the frames of every controller, each controller in SequenceNumber order without gaps,
+# - a consumer which stops taking frames fills the bounded queue, after which the stand-in can no longer send,
+# - a connection closed between two frames ends the stream, one closed in the middle of a frame raises a ConnectionError,
+# - when one controller can not be reached, the connections to the other controllers are closed as well.
+
+import asyncio
+import os
+import socket
+import sys
+import time
+import numpy as np
+from AsyncStreamClient import AsyncStreamClient, stream_controllers
+from FramePlan import CHANNEL_TYPE_ANALOG, analog_header_struct, generic_header_struct
+from StreamClient import BYTE_ORDER_MARKER, PAYLOAD_TYPE_DATA
+from StreamReceiver import header_struct
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PythonBasicsLocalServer"))
+from QServerStandIn import ChannelSpec, QServerStandIn  # noqa: E402
+
+frame_count = 200
+queue_size = 4
+
+
+def fail(message):
+    print(message)
+    exit(1)
+
+
+# A client which streams from the given port, rather than the one from /datastream/setup/.
+class FixedPortClient(AsyncStreamClient):
+    def __init__(self, ip, port, streaming_port):
+        super().__init__(ip, port)
+        self.streaming_port = streaming_port
+
+    async def request_streaming_port(self):
+        return self.streaming_port
+
+
+# A frame with a single Analog Channel of 32-bit floating point samples.
+def build_frame(sequence_number):
+    samples = np.arange(100, dtype='<f4')
+    payload = (generic_header_struct.pack(1, 0, CHANNEL_TYPE_ANALOG, samples.nbytes, sequence_number)
+               + analog_header_struct.pack(1, 0, 0.0, 0.0, 0.0) + samples.tobytes())
+    return header_struct.pack(sequence_number, 0.0, 0.0, len(payload), BYTE_ORDER_MARKER, PAYLOAD_TYPE_DATA) + payload
+
+
+# A port on which nothing is listening.
+def closed_port():
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        return unused.getsockname()[1]
+
+
+async def check_several_controllers():
+    layouts = [[ChannelSpec(channel_id, 0, 2, 51200) for channel_id in range(6)],
+               [ChannelSpec(10, 0, 0, 25600), ChannelSpec(11, 2, 0, 20000)],
+               [ChannelSpec(20, 1, 0, 1000), ChannelSpec(21, 0, 1, 51200), ChannelSpec(22, 3, 0, 10)]]
+    stand_ins = [QServerStandIn(channels).start() for channels in layouts]
+    try:
+        sequence_numbers = {}
+        channel_ids = {}
+        stream = stream_controllers([("127.0.0.1", stand_in.http_port) for stand_in in stand_ins], queue_size)
+        try:
+            async for client, frame in stream:
+                sequence_numbers.setdefault(client.port, []).append(frame.header.sequence_number)
+                channel_ids.setdefault(client.port, set()).add(tuple(channel.channel_id for channel in frame.channels))
+                if len(sequence_numbers) == len(stand_ins) and all(len(numbers) >= frame_count for numbers in sequence_numbers.values()):
+                    break
+        finally:
+            await stream.aclose()
+    finally:
+        for stand_in in stand_ins:
+            stand_in.stop()
+
+    for stand_in, channels in zip(stand_ins, layouts):
+        numbers = sequence_numbers.get(stand_in.http_port, [])
+        if numbers != list(range(numbers[0], numbers[0] + len(numbers))):
+            fail("The frames of the controller on port " + str(stand_in.http_port) + " are not in SequenceNumber order")
+        if channel_ids[stand_in.http_port] != {tuple(channel.channel_id for channel in channels)}:
+            fail("The controller on port " + str(stand_in.http_port) + " delivered the channels of another controller")
+    print("Controllers:", len(stand_ins), "Frames:", ", ".join(str(len(numbers)) for numbers in sequence_numbers.values()), "OK")
+
+
+async def check_backpressure():
+    with QServerStandIn() as stand_in:
+        async with AsyncStreamClient("127.0.0.1", stand_in.http_port, queue_size) as client:
+            # The consumer takes nothing for a while; the queue fills up and the socket buffers after it.
+            await asyncio.sleep(0.5)
+            sent = stand_in.sequence_number
+            await asyncio.sleep(0.5)
+            if client.frames.qsize() != queue_size:
+                fail("The queue holds " + str(client.frames.qsize()) + " frames instead of " + str(queue_size))
+            if stand_in.sequence_number != sent:
+                fail("The stand-in kept sending while the consumer was not taking frames")
+
+            numbers = []
+            async for frame in client:
+                numbers.append(frame.header.sequence_number)
+                if len(numbers) == frame_count:
+                    break
+            if numbers != list(range(numbers[0], numbers[0] + frame_count)):
+                fail("Frames were lost while the consumer was not taking frames")
+    print("Backpressure: the stand-in stopped after", sent, "frames with", queue_size, "frames queued OK")
+
+
+# Serve the given bytes as the data stream, then close the connection.
+async def serve_stream(data):
+    async def send(reader, writer):
+        writer.write(data)
+        await writer.drain()
+        writer.close()
+    server = await asyncio.start_server(send, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def check_closed_connections():
+    frames = b"".join(build_frame(sequence_number) for sequence_number in range(3))
+    with QServerStandIn() as stand_in:
+        # A clean close ends the iteration, a close inside a payload or a header raises the error of read_frames.
+        for data, expected_error in ((frames, None), (frames + build_frame(3)[:50], "middle of a frame"), (frames + build_frame(3)[:10], "middle of a frame")):
+            server, streaming_port = await serve_stream(data)
+            numbers = []
+            error = None
+            async with FixedPortClient("127.0.0.1", stand_in.http_port, streaming_port) as client:
+                try:
+                    async for frame in client:
+                        numbers.append(frame.header.sequence_number)
+                except ConnectionError as exception:
+                    error = str(exception)
+            server.close()
+            await server.wait_closed()
+            if numbers != [0, 1, 2] or (error is None) != (expected_error is None) or error is not None and expected_error not in error:
+                fail("A stream of " + str(len(data)) + " bytes delivered " + str(numbers) + " and raised " + repr(error))
+    print("Closed connections OK")
+
+
+async def check_connect_failure():
+    with QServerStandIn(realtime=True) as first, QServerStandIn(realtime=True) as second:
+        stream = stream_controllers([("127.0.0.1", first.http_port), ("127.0.0.1", closed_port()), ("127.0.0.1", second.http_port)])
+        try:
+            async for _ in stream:
+                fail("A frame was delivered although a controller could not be reached")
+        except OSError:
+            pass
+        else:
+            fail("An unreachable controller did not raise an error")
+
+        # The stand-ins close a connection once sending fails, which takes a frame or two after the client closed it.
+        connections = first.stream_connections + second.stream_connections
+        deadline = time.monotonic() + 2.0
+        while any(connection.fileno() != -1 for connection in connections) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if len(connections) != 2 or any(connection.fileno() != -1 for connection in connections):
+            fail("The connections to the reachable controllers were not closed")
+    print("Connect failure OK")
+
+
+async def main():
+    await check_several_controllers()
+    await check_backpressure()
+    await check_closed_connections()
+    await check_connect_failure()
+
+
+asyncio.run(main())
@@ -0,0 +1,116 @@
+# QServer introduction to Python: Check the CanDecoder against the per-message decoding.
+# This script does not need a controller, it generates CAN Channel Data with a mix of DLCs from 0 up to 64 bytes.
+# It checks that:
+# - every field of every message matches the per-message decoding of the original StreamData example,
+# - the data offsets point at the data of every message in the block,
+# - the ID filter keeps exactly the messages with the given IDs,
+# - a truncated block raises an error instead of returning padded messages,
+# - a channel following a CAN Channel in the payload is still parsed correctly, also when the number of CAN messages
+#   changes from packet to packet, which must not recompile the frame plan.
+
+import struct
+import numpy as np
+from CanDecoder import decode_can_messages, make_id_filter
+from FramePlan import CAN_HEADER_SIZE, CHANNEL_TYPE_ANALOG, CHANNEL_TYPE_CAN, FramePlanCache, analog_header_struct, generic_header_struct
+
+message_count = 500
+
+
+# The per-message decoding of the original StreamData example.
+def legacy_decode(data):
+    message_list = []
+    index = 0
+    while index < len(data):
+        message = {}
+        message["timestamp"] = struct.unpack('d', data[index:index + 8])[0]
+        message["id"] = struct.unpack('I', data[index + 8:index + 12])[0]
+        message["header"] = data[index + 12]
+        message["frame_format"] = data[index + 13]
+        message["frame_type"] = data[index + 14]
+        message["dlc"] = data[index + 15]
+        message["data"] = list(data[index + 16:index + 16 + message["dlc"]])
+        message_list.append(message)
+        index += 16 + message["dlc"]
+    return message_list
+
+
+# Build CAN Channel Data with DLCs of 0, 8, 64 and random sizes in between.
+def build_messages(rng):
+    dlcs = np.concatenate(([0, 8, 64, 1, 63], rng.integers(0, 65, message_count - 5)))
+    data = bytearray()
+    for number, dlc in enumerate(dlcs):
+        data += struct.pack('<dIBBBB', number * 0.001, int(rng.integers(0, 2 ** 29)) if number % 7 else 0x123, 1, 2, 3, int(dlc))
+        data += rng.integers(0, 256, int(dlc), dtype=np.int64).astype(np.uint8).tobytes()
+    return bytes(data)
+
+
+# A payload with a CAN Channel followed by an Analog Channel.
+def build_payload(can_data, samples):
+    return (generic_header_struct.pack(1, 0, CHANNEL_TYPE_CAN, len(can_data), 1000) + bytes(CAN_HEADER_SIZE) + can_data
+            + generic_header_struct.pack(2, 0, CHANNEL_TYPE_ANALOG, samples.nbytes, 2000)
+            + analog_header_struct.pack(1, 0, 0.0, 0.0, 99.0) + samples.tobytes())
+
+
+def fail(message):
+    print(message)
+    exit(1)
+
+
+rng = np.random.default_rng(42)
+data = build_messages(rng)
+expected = legacy_decode(data)
+messages = decode_can_messages(memoryview(data))
+
+if len(messages) != len(expected):
+    fail("Decoded " + str(len(messages)) + " messages instead of " + str(len(expected)))
+index = 0
+for message, reference in zip(messages, expected):
+    for field in ("timestamp", "id", "header", "frame_format", "frame_type", "dlc"):
+        if message[field] != reference[field]:
+            fail("Field " + field + " does not match at offset " + str(index))
+    if list(message["data"][:message["dlc"]]) != reference["data"] or message["data"][message["dlc"]:].any():
+        fail("Data does not match at offset " + str(index))
+    if message["data_offset"] != index + 16:
+        fail("Data offset does not match at offset " + str(index))
+    index += 16 + reference["dlc"]
+print("Messages:", len(messages), "with DLCs from", messages["dlc"].min(), "to", messages["dlc"].max(), "OK")
+
+filtered = decode_can_messages(memoryview(data), make_id_filter([0x123]))
+if len(filtered) != sum(1 for reference in expected if reference["id"] == 0x123) or (filtered["id"] != 0x123).any():
+    fail("The ID filter does not match")
+print("ID filter:", len(filtered), "messages OK")
+
+for cut in (3, 16, len(data) - 10):
+    try:
+        decode_can_messages(memoryview(data[:-cut]))
+    except ValueError:
+        continue
+    fail("A block truncated by " + str(cut) + " bytes was decoded without an error")
+print("Truncated blocks OK")
+
+# A payload with a CAN Channel followed by an Analog Channel, both parsed through a FramePlan.
+samples = np.arange(100, dtype='<f4')
+payload = build_payload(data, samples)
+plan_cache = FramePlanCache()
+channels = plan_cache.decode(None, memoryview(payload)).channels
+if [channel.channel_id for channel in channels] != [1, 2] or len(channels[0].data) != len(expected):
+    fail("The channels of the payload do not match")
+if channels[1].timestamp != 2000 or channels[1].header.max_value != 99.0 or not np.array_equal(channels[1].data, samples):
+    fail("The channel following the CAN Channel does not match")
+print("Channel following a CAN Channel OK")
+
+# The same layout with fewer CAN messages in every packet, down to none at all, keeps the plan.
+message_ends = np.cumsum([16 + reference["dlc"] for reference in expected])
+for count in (message_count - 1, 250, 1, 0):
+    can_data = data[:message_ends[count - 1]] if count else b""
+    channels = plan_cache.decode(None, memoryview(build_payload(can_data, samples + count))).channels
+    if len(channels[0].data) != count or not np.array_equal(channels[1].data, samples + count):
+        fail("The channels of the payload with " + str(count) + " CAN messages do not match")
+if plan_cache.compile_count != 1:
+    fail("The frame plan was compiled " + str(plan_cache.compile_count) + " times for a single layout")
+
+# A different number of analog samples is a different layout.
+channels = plan_cache.decode(None, memoryview(build_payload(data, samples[:50]))).channels
+if plan_cache.compile_count != 2 or not np.array_equal(channels[1].data, samples[:50]):
+    fail("A changed Analog Channel did not recompile the frame plan")
+print("Changing CAN message counts OK, plan compiled", plan_cache.compile_count, "times")
@@ -0,0 +1,42 @@
+# QServer introduction to Python: Check that the ChannelExporter round-trips the data.
+# This script does not need a controller. A channel is exported with a change of SampleType halfway, which changes the
+# data type of the samples, and read back with the ChannelReader in every available format.
+
+import tempfile
+import numpy as np
+from ChannelExporter import ChannelExporter, ChannelReader, FORMAT_ARROW, FORMAT_NPY, pyarrow
+
+sample_rate = 1000
+ticks_per_second = 1000000000
+block_size = 150
+
+formats = [FORMAT_NPY] + ([FORMAT_ARROW] if pyarrow is not None else [])
+if pyarrow is None:
+    print("pyarrow is not installed, the Arrow format is not checked")
+
+for file_format in formats:
+    with tempfile.TemporaryDirectory() as directory:
+        # 32-bit floating point data, then raw data which decodes to 64-bit floating point, then floating point again.
+        blocks = [(0, None, np.float32), (2, 0.5, np.float64), (2, 0.5, np.float64), (0, None, np.float32)]
+        with ChannelExporter(directory, chunk_size=200, sample_rates={1: sample_rate}, ticks_per_second=ticks_per_second,
+                             file_format=file_format) as exporter:
+            for number, (sample_type, scaling_factor, dtype) in enumerate(blocks):
+                samples = np.arange(number * block_size, (number + 1) * block_size, dtype=dtype)
+                exporter.add(1, samples, number * block_size * ticks_per_second // sample_rate, sample_type, scaling_factor)
+
+        reader = ChannelReader(directory)
+        samples, timestamps = reader.read(1)
+        expected = np.arange(len(blocks) * block_size)
+        if not np.array_equal(samples, expected) or not np.array_equal(timestamps, expected * ticks_per_second // sample_rate):
+            print(file_format, "does not round-trip the samples")
+            exit(1)
+
+        # A time range which spans the change of SampleType.
+        t0 = 100 * ticks_per_second // sample_rate
+        t1 = 400 * ticks_per_second // sample_rate
+        samples, timestamps = reader.read(1, t0, t1)
+        if not np.array_equal(samples, np.arange(100, 400)):
+            print(file_format, "does not select the time range")
+            exit(1)
+
+        print(file_format, "OK:", len(reader.chunks(1)), "chunks in", len({entry["File"] for entry in reader.chunks(1)}), "files")
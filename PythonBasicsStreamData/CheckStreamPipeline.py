@@ -0,0 +1,116 @@
+# QServer introduction to Python: Check that the StreamPipeline decodes the same frames as a single loop.
+# This script does not need a controller, it streams a mix of Analog, Counter, CAN and GPS Channels from a QServerStandIn.
+# The raw payloads are kept through the recorder hook of the pipeline and decoded again in this process. It checks that:
+# - the frames come out in SequenceNumber order without gaps,
+# - every channel of every frame matches the decoding of the raw payload, for several worker counts and batch sizes,
+# - slots which are too small are replaced while the stream is running, and a worker maps at most one version of every
+#   slot. The stand-in sends payloads of a fixed size, hence this part streams payloads that keep growing.
+
+import os
+import socket
+import sys
+import threading
+import numpy as np
+from FramePlan import CHANNEL_TYPE_ANALOG, FramePlanCache, analog_header_struct, generic_header_struct
+from StreamClient import BYTE_ORDER_MARKER, PAYLOAD_TYPE_DATA
+from StreamPipeline import StreamPipeline
+from StreamReceiver import StreamReceiver, header_struct
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PythonBasicsLocalServer"))
+from QServerStandIn import ChannelSpec, QServerStandIn  # noqa: E402
+
+frame_count = 300
+channels = ([ChannelSpec(channel_id, 0, channel_id % 4, 25600) for channel_id in range(6)]
+            + [ChannelSpec(6, 1, 0, 1000), ChannelSpec(7, 2, 0, 20000), ChannelSpec(8, 3, 0, 10)])
+
+
+# Keeps a copy of every raw payload, by SequenceNumber.
+class PayloadCopies:
+    def __init__(self):
+        self.payloads = {}
+
+    def record(self, header, payload):
+        self.payloads[header.sequence_number] = bytes(payload)
+
+
+# A frame with a single Analog Channel of 32-bit floating point samples.
+def build_frame(sequence_number, samples):
+    payload = (generic_header_struct.pack(1, 0, CHANNEL_TYPE_ANALOG, samples.nbytes, sequence_number)
+               + analog_header_struct.pack(1, 0, 0.0, 0.0, 0.0) + samples.tobytes())
+    return header_struct.pack(sequence_number, 0.0, 0.0, len(payload), BYTE_ORDER_MARKER, PAYLOAD_TYPE_DATA) + payload
+
+
+# The samples of a frame in the growing stream; every frame has more samples than the one before.
+def growing_samples(sequence_number):
+    return np.arange(100 + sequence_number * 50, dtype='<f4') + sequence_number
+
+
+def fail(message):
+    print(message)
+    exit(1)
+
+
+def same_data(data, reference):
+    if isinstance(reference, np.ndarray):
+        return isinstance(data, np.ndarray) and data.dtype == reference.dtype and np.array_equal(data, reference)
+    return data == reference
+
+
+# The names of the shared memory slots a worker process has mapped, only available on Linux.
+def mapped_slots(pid):
+    maps_path = "/proc/" + str(pid) + "/maps"
+    if not os.path.exists(maps_path):
+        return None
+    with open(maps_path) as maps:
+        return {line.split("/dev/shm/")[1].split()[0] for line in maps if "/dev/shm/psm_" in line}
+
+
+for worker_count, batch_size in ((1, 1), (2, 8), (4, 3)):
+    with QServerStandIn(channels) as stand_in:
+        client_socket = socket.create_connection(("127.0.0.1", stand_in.tcp_port))
+        copies = PayloadCopies()
+        reference = FramePlanCache()
+        # Slots of 1 kB are too small for these payloads, hence every slot is replaced on its first use.
+        with StreamPipeline(StreamReceiver(client_socket), worker_count, slot_size=1024, batch_size=batch_size, recorder=copies) as pipeline:
+            previous = None
+            for received, frame in enumerate(pipeline.frames(), 1):
+                sequence_number = frame.header.sequence_number
+                if previous is not None and sequence_number != previous + 1:
+                    fail("Frame " + str(sequence_number) + " followed frame " + str(previous))
+                previous = sequence_number
+
+                expected = reference.decode(frame.header, memoryview(copies.payloads.pop(sequence_number))).channels
+                if len(frame.channels) != len(expected):
+                    fail("Frame " + str(sequence_number) + " has " + str(len(frame.channels)) + " channels instead of " + str(len(expected)))
+                for channel, expected_channel in zip(frame.channels, expected):
+                    if channel[:-1] != expected_channel[:-1] or not same_data(channel.data, expected_channel.data):
+                        fail("Channel " + str(channel.channel_id) + " of frame " + str(sequence_number) + " does not match")
+                if received == frame_count:
+                    break
+
+            for worker in pipeline.workers:
+                mapped = mapped_slots(worker.pid)
+                if mapped is not None and len(mapped) > pipeline.slot_count:
+                    fail("A worker maps " + str(len(mapped)) + " slots, the pipeline has " + str(pipeline.slot_count))
+        client_socket.close()
+    print("Workers:", worker_count, "Batch size:", batch_size, "Frames:", frame_count, "OK")
+
+# Payloads which keep growing replace the slots over and over again while the workers are decoding.
+server_socket, client_socket = socket.socketpair()
+sender = threading.Thread(target=lambda: server_socket.sendall(b"".join(build_frame(number, growing_samples(number)) for number in range(frame_count))), daemon=True)
+sender.start()
+with StreamPipeline(StreamReceiver(client_socket), 2, slot_count=4, slot_size=1024) as pipeline:
+    for received, frame in enumerate(pipeline.frames(), 1):
+        sequence_number = frame.header.sequence_number
+        if not np.array_equal(frame.channels[0].data, growing_samples(sequence_number)):
+            fail("The samples of growing frame " + str(sequence_number) + " do not match")
+        if received == frame_count:
+            break
+
+    for worker in pipeline.workers:
+        mapped = mapped_slots(worker.pid)
+        if mapped is not None and len(mapped) > pipeline.slot_count:
+            fail("A worker maps " + str(len(mapped)) + " slots, the pipeline has " + str(pipeline.slot_count))
+server_socket.close()
+client_socket.close()
+print("Growing payloads:", frame_count, "frames OK")
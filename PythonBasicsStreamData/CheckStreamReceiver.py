@@ -0,0 +1,62 @@
+# QServer introduction to Python: Check that the StreamReceiver reassembles frames from partial reads.
+# This script does not need a controller. A fake socket hands out the bytes of a stream of frames in pieces of 1 to 7
+# bytes, so every header and payload is split over many recv_into calls. It checks that:
+# - every header and payload is reassembled exactly, including empty payloads and payloads larger than the buffer,
+# - a connection closed in the middle of a header or a payload raises a ConnectionError.
+
+import numpy as np
+from StreamReceiver import StreamReceiver, StreamHeader, header_struct
+
+frame_count = 200
+
+
+# A socket which returns at most a few bytes on every recv_into, and 0 bytes once the data is exhausted.
+class FragmentingSocket:
+    def __init__(self, data, rng, max_fragment=7):
+        self.data = data
+        self.position = 0
+        self.rng = rng
+        self.max_fragment = max_fragment
+
+    def recv_into(self, view, nbytes=0):
+        size = min(nbytes or len(view), int(self.rng.integers(1, self.max_fragment + 1)), len(self.data) - self.position)
+        view[:size] = self.data[self.position:self.position + size]
+        self.position += size
+        return size
+
+
+def fail(message):
+    print(message)
+    exit(1)
+
+
+rng = np.random.default_rng(42)
+headers = []
+payloads = []
+for sequence_number in range(frame_count):
+    # Mostly small payloads, some empty ones and some larger than the initial capacity of the receiver.
+    payload_size = int(rng.choice([0, int(rng.integers(1, 64)), int(rng.integers(64, 4096))], p=[0.1, 0.6, 0.3]))
+    payload = rng.integers(0, 256, payload_size, dtype=np.int64).astype(np.uint8).tobytes()
+    headers.append(StreamHeader(sequence_number, sequence_number * 0.01, 0.5, payload_size, 0xFEFF, 1))
+    payloads.append(payload)
+data = b"".join(header_struct.pack(*header) + payload for header, payload in zip(headers, payloads))
+
+receiver = StreamReceiver(FragmentingSocket(data, rng), initial_capacity=16)
+for header, payload in zip(headers, payloads):
+    received_header, received_payload = receiver.read_frame()
+    if received_header != header:
+        fail("Header " + str(header.sequence_number) + " does not match")
+    if bytes(received_payload) != payload:
+        fail("Payload " + str(header.sequence_number) + " does not match")
+print("Frames:", frame_count, "in", len(data), "bytes, largest payload", max(len(payload) for payload in payloads), "bytes OK")
+
+# The connection closes after the given number of bytes: at the start of a frame, inside a header and inside a payload.
+frame = header_struct.pack(*headers[-1]) + payloads[-1]
+for cut in (0, 5, header_struct.size + len(payloads[-1]) // 2):
+    receiver = StreamReceiver(FragmentingSocket(frame[:cut], rng))
+    try:
+        receiver.read_frame()
+    except ConnectionError:
+        continue
+    fail("A connection closed after " + str(cut) + " bytes did not raise a ConnectionError")
+print("Closed connections OK")
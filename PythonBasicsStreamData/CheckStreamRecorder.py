@@ -0,0 +1,140 @@
+# QServer introduction to Python: Check that a recorded stream replays exactly as it was received.
+# This script does not need a controller, it records a mix of Analog, Counter, CAN and GPS Channels from a QServerStandIn
+# into a temporary directory, with small segments so the capture spans several segment files. It checks that:
+# - the replay decodes every frame to the same channels as the stream client did while recording,
+# - seeking by SequenceNumber and by TransmitTimestamp continues the replay at the right frame,
+# - a CaptureReplay can stand in for the socket of a StreamClient, and ends with a ConnectionError,
+# - a recorder whose writer falls behind drops frames and counts them in the StreamHealth, without stalling the client,
+#   while a blocking recorder captures every frame.
+
+import copy
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from StreamClient import StreamClient
+from StreamRecorder import CaptureReplay, StreamRecorder
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PythonBasicsLocalServer"))
+from QServerStandIn import ChannelSpec, QServerStandIn  # noqa: E402
+
+frame_count = 200
+channels = ([ChannelSpec(channel_id, 0, channel_id % 4, 25600) for channel_id in range(4)]
+            + [ChannelSpec(4, 1, 0, 1000), ChannelSpec(5, 2, 0, 20000), ChannelSpec(6, 3, 0, 10)])
+
+
+# A recorder with a disk that can not keep up with the stream.
+class SlowRecorder(StreamRecorder):
+    def write_frame(self, header, payload):
+        time.sleep(0.005)
+        super().write_frame(header, payload)
+
+
+def fail(message):
+    print(message)
+    exit(1)
+
+
+# The decoded channels of a frame, copied since the data may be a view on the receive buffer.
+def copy_channels(frame):
+    return [(channel[:-1], np.array(channel.data) if isinstance(channel.data, np.ndarray) else copy.deepcopy(channel.data)) for channel in frame.channels]
+
+
+def same_channels(frame, expected):
+    if len(frame.channels) != len(expected):
+        return False
+    for channel, (expected_fields, expected_data) in zip(frame.channels, expected):
+        if channel[:-1] != expected_fields:
+            return False
+        if isinstance(expected_data, np.ndarray):
+            if not isinstance(channel.data, np.ndarray) or channel.data.dtype != expected_data.dtype or not np.array_equal(channel.data, expected_data):
+                return False
+        elif channel.data != expected_data:
+            return False
+    return True
+
+
+# Stream frames from a stand-in with the recorder attached; returns the health and the decoded frames by SequenceNumber.
+def record(recorder, count):
+    with QServerStandIn(channels) as stand_in:
+        client = StreamClient("127.0.0.1", stand_in.http_port)
+        client.connect()
+        client.recorder = recorder
+        try:
+            received = {frame.header.sequence_number: (frame.header, copy_channels(frame)) for frame in client.frames(count)}
+        finally:
+            client.close()
+            recorder.close()
+    return client.health, received
+
+
+with tempfile.TemporaryDirectory() as directory:
+    health, received = record(StreamRecorder(directory, segment_size=256 * 1024, block=True), frame_count)
+    segment_count = len([name for name in os.listdir(directory) if name.endswith(".qsc")])
+    if health.recording_drops != 0:
+        fail("A blocking recorder dropped " + str(health.recording_drops) + " frames")
+    if segment_count < 2:
+        fail("The capture fits in a single segment, make the segments smaller")
+
+    with CaptureReplay(directory) as replay:
+        if len(replay) != frame_count:
+            fail("The capture holds " + str(len(replay)) + " frames instead of " + str(frame_count))
+        replayed = 0
+        for frame in replay.frames():
+            header, expected = received[frame.header.sequence_number]
+            if frame.header != header or not same_channels(frame, expected):
+                fail("Frame " + str(header.sequence_number) + " does not replay as it was received")
+            replayed += 1
+        if replayed != frame_count:
+            fail("The replay returned " + str(replayed) + " frames instead of " + str(frame_count))
+        print("Recorded:", frame_count, "frames in", segment_count, "segments, replayed OK")
+
+        sequence_numbers = sorted(received)
+        for position in (0, 1, frame_count // 2, frame_count - 1):
+            replay.seek_sequence(sequence_numbers[position])
+            if replay.read_frame()[0].sequence_number != sequence_numbers[position]:
+                fail("Seeking SequenceNumber " + str(sequence_numbers[position]) + " continues at the wrong frame")
+            replay.seek_time(received[sequence_numbers[position]][0].transmit_timestamp)
+            if replay.read_frame()[0].sequence_number != sequence_numbers[position]:
+                fail("Seeking the TransmitTimestamp of frame " + str(sequence_numbers[position]) + " continues at the wrong frame")
+        replay.seek_sequence(sequence_numbers[-1] + 1)
+        try:
+            replay.read_frame()
+            fail("Seeking past the last frame did not end the replay")
+        except ConnectionError:
+            pass
+        print("Seek OK")
+
+    # The replay stands in for the socket; the client decodes the frames as if they came from the controller.
+    client = StreamClient("127.0.0.1")
+    client.receiver = CaptureReplay(directory)
+    client.receiver.seek_sequence(sequence_numbers[frame_count // 2])
+    for frame in client.frames(frame_count - frame_count // 2):
+        if not same_channels(frame, received[frame.header.sequence_number][1]):
+            fail("Frame " + str(frame.header.sequence_number) + " decodes differently through the StreamClient")
+    try:
+        client.read_frame()
+        fail("The end of the capture did not raise a ConnectionError")
+    except ConnectionError:
+        pass
+    if client.health.missing_frames != 0 or client.health.frame_count != frame_count - frame_count // 2:
+        fail("The StreamClient counted " + str(client.health.frame_count) + " frames with " + str(client.health.missing_frames) + " missing")
+    client.receiver.close()
+    print("Replay through the StreamClient OK")
+
+with tempfile.TemporaryDirectory() as directory:
+    recorder = SlowRecorder(directory, queue_size=8)
+    health, received = record(recorder, frame_count)
+    if health.recording_drops == 0 or health.recording_drops != recorder.dropped_count:
+        fail("The health counted " + str(health.recording_drops) + " dropped frames, the recorder " + str(recorder.dropped_count))
+    with CaptureReplay(directory) as replay:
+        captured = [int(sequence_number) for sequence_number in replay.index["sequence_number"]]
+        if len(captured) + health.recording_drops != frame_count:
+            fail("The capture holds " + str(len(captured)) + " frames, " + str(health.recording_drops) + " were dropped, of " + str(frame_count))
+        if captured != sorted(captured) or not set(captured) <= set(received):
+            fail("The capture of the slow recorder holds frames out of order")
+        for frame in replay.frames():
+            if not same_channels(frame, received[frame.header.sequence_number][1]):
+                fail("Frame " + str(frame.header.sequence_number) + " of the slow recorder does not replay as it was received")
+    print("Slow recorder: dropped", health.recording_drops, "of", frame_count, "frames OK")
@@ -0,0 +1,80 @@
+# QServer introduction to Python: Check that a StreamSession survives a dropped connection.
+# This script does not need a controller, it streams from a QServerStandIn and kills the connection in the middle of the
+# stream a few times. It checks that the session reconnects every time, keeps its frame plan, delivers the frames in
+# SequenceNumber order, and reports the frames lost while reconnecting as gaps in the StreamHealth.
+# It then restarts the numbering of the stand-in, as a rebooted controller would, and checks that the session delivers
+# the frames of the new numbering and the StreamHealth counts a restart instead of duplicates.
+
+import os
+import sys
+import time
+from ChannelRingBuffer import ChannelStore
+from StreamSession import StreamSession
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PythonBasicsLocalServer"))
+from QServerStandIn import QServerStandIn  # noqa: E402
+
+frame_count = 300
+disconnect_at = (50, 150, 250)
+
+
+def fail(message):
+    print(message)
+    exit(1)
+
+
+with QServerStandIn(realtime=True) as stand_in:
+    store = ChannelStore(capacity=1000000)
+    with StreamSession("127.0.0.1", stand_in.http_port, store=store, receive_timeout=2.0) as session:
+        reconnect_times = []
+        session.on_reconnect = lambda reconnected: reconnect_times.append(time.perf_counter())
+
+        sequence_numbers = []
+        disconnect_times = []
+        for number, frame in enumerate(session.frames(frame_count)):
+            sequence_numbers.append(frame.header.sequence_number)
+            if number in disconnect_at:
+                disconnect_times.append(time.perf_counter())
+                stand_in.disconnect_clients()
+
+        health = session.health
+        if session.reconnect_count != len(disconnect_at):
+            fail("Reconnected " + str(session.reconnect_count) + " times instead of " + str(len(disconnect_at)))
+        if session.client.plan_cache.compile_count != 1:
+            fail("The frame plan was compiled " + str(session.client.plan_cache.compile_count) + " times")
+        if any(later <= earlier for earlier, later in zip(sequence_numbers, sequence_numbers[1:])):
+            fail("The frames are not in SequenceNumber order")
+
+        # Every jump in the delivered SequenceNumbers is a gap, and the StreamHealth must have counted each of them.
+        jumps = [later - earlier - 1 for earlier, later in zip(sequence_numbers, sequence_numbers[1:]) if later != earlier + 1]
+        if health.gap_count != len(jumps) or health.missing_frames != sum(jumps):
+            fail("The StreamHealth counted " + str(health.gap_count) + " gaps and " + str(health.missing_frames)
+                 + " missing frames, the frames show " + str(len(jumps)) + " gaps and " + str(sum(jumps)) + " missing frames")
+        if health.gap_count > len(disconnect_at) or session.duplicate_count:
+            fail("Unexpected gaps or duplicate frames")
+        if store[5].count == 0:
+            fail("The store did not receive the frames")
+
+        recovery = [(reconnected - disconnected) * 1000.0 for disconnected, reconnected in zip(disconnect_times, reconnect_times)]
+        print("Frames:", len(sequence_numbers), "Reconnects:", session.reconnect_count, "Plan compiles:", session.client.plan_cache.compile_count)
+        print("Gaps:", health.gap_count, "Missing frames:", health.missing_frames)
+        print("Recovery [ms]:", ", ".join("{:.1f}".format(milliseconds) for milliseconds in recovery))
+        print("OK")
+
+# The controller restarts its numbering while the session is connected.
+with QServerStandIn(realtime=True) as stand_in:
+    with StreamSession("127.0.0.1", stand_in.http_port, receive_timeout=2.0, resume_window=50) as session:
+        sequence_numbers = []
+        for number, frame in enumerate(session.frames(300)):
+            sequence_numbers.append(frame.header.sequence_number)
+            if number == 200:
+                stand_in.sequence_number = 0
+                stand_in.disconnect_clients()
+
+        health = session.health
+        restart = next(index for index, (earlier, later) in enumerate(zip(sequence_numbers, sequence_numbers[1:])) if later < earlier) + 1
+        if health.restart_count != 1 or health.duplicate_count or session.duplicate_count:
+            fail("Counted " + str(health.restart_count) + " restarts and " + str(health.duplicate_count) + " duplicates")
+        if any(later <= earlier for earlier, later in zip(sequence_numbers[restart:], sequence_numbers[restart + 1:])):
+            fail("The frames after the restart are not in SequenceNumber order")
+        print("Restart after frame", sequence_numbers[restart - 1], "continued at", sequence_numbers[restart], "Restarts:", health.restart_count, "OK")
@@ -0,0 +1,298 @@
+# QServer introduction to Python: Compiling the payload layout into a reusable frame plan.
+# As long as the configuration does not change, every payload contains the same sequence of channels.
+# Rather than interpreting every Generic Channel Header on every packet, the layout of the first payload is compiled into
+# a plan holding precompiled struct.Struct objects, fixed offsets and a decoder for every channel.
+# Later payloads only need to check that their channel headers still match the plan, which is a single unpack and compare.
+# When the configuration changes, for example after /system/settings/apply, the check fails and the plan is rebuilt.
+# The ChannelDataSize of CAN and GPS Channels changes from packet to packet, hence it is not part of the plan: the
+# channels following such a channel are located from its actual ChannelDataSize when the payload is decoded.
+# A ChannelFilter selects the channels to decode; of the other channels only the Generic Channel Header is read,
+# their data is skipped using the ChannelDataSize. Channels of an unknown ChannelType are skipped the same way.
+
+import struct
+import time
+from collections import namedtuple
+from CanDecoder import decode_can_messages
+from SampleDecoder import decode_analog_block
+
+# The Channel types as specified in the Generic Channel Header.
+CHANNEL_TYPE_ANALOG = 0
+CHANNEL_TYPE_COUNTER = 1
+CHANNEL_TYPE_CAN = 2
+CHANNEL_TYPE_GPS = 3
+
+# The Generic Channel Header:
+# - ChannelId: The Channel identifier; 32-bit signed integer
+# - SampleType: The type of the sample data; 32-bit signed integer
+# - ChannelType: The type of the Channel; 32-bit unsigned integer
+# - ChannelDataSize: The size of the Channel data; 32-bit unsigned integer
+# - Timestamp: The timestamp of the sample data; 64-bit unsigned integer
+generic_header_struct = struct.Struct('<iiIIQ')
+GENERIC_HEADER_SIZE = generic_header_struct.size
+
+# The Analog Channel Header: ChannelIntegrity, LevelCrossingOccurred, Level, Min and Max.
+analog_header_struct = struct.Struct('<iifff')
+AnalogHeader = namedtuple("AnalogHeader", ["channel_integrity", "level_crossing_occurred", "level", "min_value", "max_value"])
+
+# The CAN Bus Channel Header reserves 24 bytes for future use.
+CAN_HEADER_SIZE = 24
+
+# The GPS Channel Header: Timestamp, AccuracyInNanoSeconds, IsLeapSecondsValid and LeapSeconds.
+gps_header_struct = struct.Struct('<QHBB')
+GpsHeader = namedtuple("GpsHeader", ["timestamp", "accuracy_in_nanoseconds", "is_leap_seconds_valid", "leap_seconds"])
+
+# The Channel types whose ChannelDataSize differs from packet to packet: the number of CAN messages and the length of
+# the GPS message vary.
+VARIABLE_SIZE_CHANNEL_TYPES = frozenset((CHANNEL_TYPE_CAN, CHANNEL_TYPE_GPS))
+
+# A decoded channel block. The header is the Specific Channel Header (None for Counter Channels),
+# the scaling factor is only set for the raw analog SampleTypes.
+DecodedChannel = namedtuple("DecodedChannel", ["channel_id", "sample_type", "channel_type", "timestamp", "header", "scaling_factor", "data"])
+DecodedFrame = namedtuple("DecodedFrame", ["header", "channels"])
+
+# A single channel in a compiled plan; the offset points to the Generic Channel Header of the channel in the payload the
+# plan was compiled from. The decoder is None for channels which are skipped.
+ChannelPlan = namedtuple("ChannelPlan", ["channel_id", "sample_type", "channel_type", "channel_data_size", "offset", "block_size", "decoder"])
+
+
+# The decoders all take the payload, the offset of the data following the Generic Channel Header and the ChannelDataSize.
+# They return the Specific Channel Header, the scaling factor and the decoded data.
+def make_analog_decoder(sample_type):
+    def decode_analog(payload, offset, channel_data_size):
+        header = AnalogHeader._make(analog_header_struct.unpack_from(payload, offset))
+        data, scaling_factor, _ = decode_analog_block(sample_type, payload[offset + analog_header_struct.size:], channel_data_size)
+        return header, scaling_factor, data
+    return decode_analog
+
+
+def decode_counter(payload, offset, channel_data_size):
+    # The Counter Channels (Tacho) does not have a specific header, the data is a list of 64-bit floating point values.
+    return None, None, struct.unpack_from('<' + str(channel_data_size // 8) + 'd', payload, offset)
+
+
+# The CAN messages are decoded into a structured array, see CanDecoder for the fields.
+# The allowed IDs are an optional filter from CanDecoder.make_id_filter.
+def make_can_decoder(allowed_ids=None):
+    def decode_can(payload, offset, channel_data_size):
+        start = offset + CAN_HEADER_SIZE
+        return None, None, decode_can_messages(payload[start:start + channel_data_size], allowed_ids)
+    return decode_can
+
+
+def decode_gps(payload, offset, channel_data_size):
+    # NOTE: GPS channel is still in Beta, use at own risk.
+    # The GPS message is formatted in ASCII and always ends with a /r/n.
+    header = GpsHeader._make(gps_header_struct.unpack_from(payload, offset))
+    start = offset + gps_header_struct.size
+    return header, None, str(payload[start:start + channel_data_size], 'ascii')
+
+
+# The number of bytes following the Generic Channel Header for a channel, i.e. the Specific Channel Header plus the data.
+def channel_block_size(sample_type, channel_type, channel_data_size):
+    if channel_type == CHANNEL_TYPE_ANALOG:
+        # The raw SampleTypes carry an additional 32-bit scaling factor before the data.
+        return analog_header_struct.size + (4 if sample_type != 0 else 0) + channel_data_size
+    elif channel_type == CHANNEL_TYPE_COUNTER:
+        return channel_data_size
+    elif channel_type == CHANNEL_TYPE_CAN:
+        return CAN_HEADER_SIZE + channel_data_size
+    elif channel_type == CHANNEL_TYPE_GPS:
+        return gps_header_struct.size + channel_data_size
+    raise ValueError("Unknown Channel Type: " + str(channel_type))
+
+
+def is_known_channel_type(channel_type):
+    return CHANNEL_TYPE_ANALOG <= channel_type <= CHANNEL_TYPE_GPS
+
+
+# Selects channels by ChannelId, ChannelType and/or SampleType; a criterion left at None accepts every value.
+# For example ChannelFilter(channel_types=[CHANNEL_TYPE_ANALOG]) selects all Analog Channels.
+class ChannelFilter:
+    def __init__(self, channel_ids=None, channel_types=None, sample_types=None):
+        self.channel_ids = None if channel_ids is None else frozenset(channel_ids)
+        self.channel_types = None if channel_types is None else frozenset(channel_types)
+        self.sample_types = None if sample_types is None else frozenset(sample_types)
+
+    def __call__(self, channel_id, sample_type, channel_type):
+        return ((self.channel_ids is None or channel_id in self.channel_ids)
+                and (self.channel_types is None or channel_type in self.channel_types)
+                and (self.sample_types is None or sample_type in self.sample_types))
+
+
+def make_decoder(sample_type, channel_type, can_ids=None):
+    if channel_type == CHANNEL_TYPE_ANALOG:
+        return make_analog_decoder(sample_type)
+    elif channel_type == CHANNEL_TYPE_COUNTER:
+        return decode_counter
+    elif channel_type == CHANNEL_TYPE_CAN:
+        return make_can_decoder(can_ids)
+    elif channel_type == CHANNEL_TYPE_GPS:
+        return decode_gps
+    raise ValueError("Unknown Channel Type: " + str(channel_type))
+
+
+# Build a single struct format which reads a field of the given format at each offset, skipping the bytes in between.
+def build_layout_struct(offsets, field_format, field_size):
+    layout_format = '<'
+    position = 0
+    for offset in offsets:
+        if offset > position:
+            layout_format += str(offset - position) + 'x'
+        layout_format += field_format
+        position = offset + field_size
+    return struct.Struct(layout_format)
+
+
+# A run of channels at fixed offsets from the start of the segment. Only the last channel of a segment can have a
+# variable size, its ChannelDataSize tells where the next segment starts.
+class PlanSegment:
+    def __init__(self, channels):
+        self.channels = channels
+        base = channels[0].offset
+        self.offsets = [channel.offset - base for channel in channels]
+        self.variable = channels[-1].channel_type in VARIABLE_SIZE_CHANNEL_TYPES
+
+        # The signature of the segment is the ChannelId, SampleType, ChannelType and ChannelDataSize of every channel,
+        # without the ChannelDataSize of a variable size channel, which is the last value read by the signature struct.
+        signature = tuple(value for channel in channels
+                          for value in (channel.channel_id, channel.sample_type, channel.channel_type, channel.channel_data_size))
+        self.signature = signature[:-1] if self.variable else signature
+        self.signature_struct = build_layout_struct(self.offsets, 'iiII', 16)
+        self.timestamp_struct = build_layout_struct([offset + 16 for offset in self.offsets], 'Q', 8)
+
+        # The ChannelDataSize of every channel, and the size of the segment without the data of a variable size channel.
+        self.data_sizes = tuple(channel.channel_data_size for channel in channels)
+        self.fixed_size = sum(channel.block_size for channel in channels) - (channels[-1].channel_data_size if self.variable else 0)
+
+
+class FramePlan:
+    def __init__(self, channels, payload_size):
+        self.channels = channels
+        self.payload_size = payload_size
+
+        # A new segment starts after every variable size channel.
+        self.segments = []
+        first = 0
+        for index, channel in enumerate(channels):
+            if channel.channel_type in VARIABLE_SIZE_CHANNEL_TYPES or index == len(channels) - 1:
+                self.segments.append(PlanSegment(channels[first:index + 1]))
+                first = index + 1
+        self.fixed_layout = [(0, None)] if len(self.segments) == 1 and not self.segments[0].variable else None
+
+    # Find the segments of a payload which has the layout this plan was compiled for.
+    # Returns the offset and the ChannelDataSize of the variable size channel of every segment, or None if the payload
+    # does not match the plan.
+    def locate(self, payload):
+        payload_size = len(payload)
+        if self.fixed_layout is not None:
+            segment = self.segments[0]
+            if payload_size == segment.fixed_size and segment.signature_struct.unpack_from(payload, 0) == segment.signature:
+                return self.fixed_layout
+            return None
+
+        layout = []
+        base = 0
+        for segment in self.segments:
+            end = base + segment.fixed_size
+            if end > payload_size:
+                return None
+            values = segment.signature_struct.unpack_from(payload, base)
+            if segment.variable:
+                if values[:-1] != segment.signature:
+                    return None
+                layout.append((base, values[-1]))
+                end += values[-1]
+            elif values != segment.signature:
+                return None
+            else:
+                layout.append((base, None))
+            base = end
+        return layout if base == payload_size else None
+
+    # Check if the payload still has the layout this plan was compiled for.
+    def matches(self, payload):
+        return self.locate(payload) is not None
+
+    # Decode all the channels of a payload which matches this plan; the layout is the result of locate.
+    # When a StreamHealth with detailed timing is given, the decode time of every channel is recorded.
+    # When an error handler is given, a channel which fails to decode is left out of the result and the handler is
+    # called with the ChannelPlan and the exception, so one bad channel does not cost the other channels of the frame.
+    def decode(self, payload, health=None, on_error=None, layout=None):
+        if layout is None:
+            layout = self.locate(payload)
+            if layout is None:
+                raise ValueError("The payload does not match the frame plan")
+        timed = health is not None and health.detailed_timing
+        channels = []
+        for segment, (base, variable_size) in zip(self.segments, layout):
+            timestamps = segment.timestamp_struct.unpack_from(payload, base)
+            data_sizes = segment.data_sizes if variable_size is None else segment.data_sizes[:-1] + (variable_size,)
+            for channel, offset, channel_data_size, timestamp in zip(segment.channels, segment.offsets, data_sizes, timestamps):
+                if channel.decoder is None:
+                    continue
+                if timed:
+                    start = time.perf_counter()
+                try:
+                    header, scaling_factor, data = channel.decoder(payload, base + offset + GENERIC_HEADER_SIZE, channel_data_size)
+                except Exception as error:
+                    if on_error is None:
+                        raise
+                    on_error(channel, error)
+                    continue
+                if timed:
+                    health.add_decode_time(channel.channel_type, time.perf_counter() - start)
+                channels.append(DecodedChannel(channel.channel_id, channel.sample_type, channel.channel_type, timestamp, header, scaling_factor, data))
+        return channels
+
+
+# Walk the Generic Channel Headers of a payload once and compile its layout into a plan.
+# The CAN IDs are an optional filter from CanDecoder.make_id_filter, applied to every CAN Channel.
+# The channel filter is an optional function of (channel_id, sample_type, channel_type), such as a ChannelFilter,
+# which returns False for the channels to skip.
+# Channels of an unknown ChannelType are skipped as well: their size is taken to be just the ChannelDataSize.
+def compile_plan(payload, can_ids=None, channel_filter=None):
+    channels = []
+    index = 0
+    payload_size = len(payload)
+    while index < payload_size:
+        channel_id, sample_type, channel_type, channel_data_size, _ = generic_header_struct.unpack_from(payload, index)
+        known = is_known_channel_type(channel_type)
+        block_size = GENERIC_HEADER_SIZE + (channel_block_size(sample_type, channel_type, channel_data_size) if known else channel_data_size)
+        if index + block_size > payload_size:
+            raise ValueError("Channel block of ChannelId " + str(channel_id) + " exceeds the payload")
+        decoder = None
+        if known and (channel_filter is None or channel_filter(channel_id, sample_type, channel_type)):
+            decoder = make_decoder(sample_type, channel_type, can_ids)
+        channels.append(ChannelPlan(channel_id, sample_type, channel_type, channel_data_size, index, block_size, decoder))
+        index += block_size
+    return FramePlan(channels, payload_size)
+
+
+# Holds the plan for the current layout and rebuilds it whenever a payload no longer matches.
+# A different ChannelDataSize of a CAN or GPS Channel does not change the layout, the plan is kept.
+class FramePlanCache:
+    def __init__(self, can_ids=None, channel_filter=None):
+        self.can_ids = can_ids
+        self.channel_filter = channel_filter
+        self.plan = None
+        self.compile_count = 0
+
+    # Drop the current plan, for example after the settings were applied or the channel filter changed.
+    def invalidate(self):
+        self.plan = None
+
+    def get_plan(self, payload):
+        return self.locate(payload)[0]
+
+    # The plan for the payload and the layout of the payload, see FramePlan.locate.
+    def locate(self, payload):
+        layout = None if self.plan is None else self.plan.locate(payload)
+        if layout is None:
+            self.plan = compile_plan(payload, self.can_ids, self.channel_filter)
+            self.compile_count += 1
+            layout = self.plan.locate(payload)
+        return self.plan, layout
+
+    def decode(self, header, payload, health=None, on_error=None):
+        plan, layout = self.locate(payload)
+        return DecodedFrame(header, plan.decode(payload, health, on_error, layout))
@@ -0,0 +1,91 @@
+# QServer introduction to Python: Vectorized decoding of analog sample data.
+# The StreamData example decodes the analog samples one at a time, which is easy to follow but slow at high sample rates.
+# This module decodes a complete channel block in one step using NumPy, returning the same values as the per-sample code.
+
+import struct
+import numpy as np
+
+# The analog SampleTypes as specified in the Generic Channel Header:
+# - 0: 32-bit floating point data, already scaled by the controller.
+# - 1: 16-bit signed integer data, followed by a scaling factor.
+# - 2: 24-bit signed integer data, followed by a scaling factor.
+# - 3: 32-bit signed integer data, followed by a scaling factor.
+SAMPLE_TYPE_FLOAT32 = 0
+SAMPLE_TYPE_INT16 = 1
+SAMPLE_TYPE_INT24 = 2
+SAMPLE_TYPE_INT32 = 3
+
+# The raw SampleTypes (1, 2 and 3) carry a 32-bit floating point scaling factor before the sampled data.
+scaling_factor_struct = struct.Struct('<f')
+
+# The number of bytes used by a single sample of each SampleType.
+sample_sizes = {
+    SAMPLE_TYPE_FLOAT32: 4,
+    SAMPLE_TYPE_INT16: 2,
+    SAMPLE_TYPE_INT24: 3,
+    SAMPLE_TYPE_INT32: 4,
+}
+
+
+# SampleType 0 is already scaled, hence we can use the bytes directly as 32-bit floating point values.
+# The samples are copied into a new array, since the data is usually a view on a receive buffer that will be reused.
+def decode_float32(data, dtype=np.float32):
+    return np.frombuffer(data, dtype='<f4').astype(dtype)
+
+
+# SampleType 1 is 16-bit signed integer data which must be scaled to a float.
+def decode_int16(data, scaling_factor, dtype=np.float64):
+    samples = np.frombuffer(data, dtype='<i2').astype(dtype)
+    samples *= scaling_factor
+    return samples
+
+
+# SampleType 2 is 24-bit signed integer data which must be scaled to a float.
+# Each sample is left-aligned into a 32-bit signed integer, just like the StreamData example does:
+# the three bytes are placed in the upper three bytes of the integer and the lowest byte is left as zero.
+# Hence the sign is extended for free and the scaling factor supplied by QServer can be used as is.
+def decode_int24(data, scaling_factor, dtype=np.float64):
+    raw = np.frombuffer(data, dtype=np.uint8)
+    sample_count = len(raw) // 3
+
+    aligned = np.zeros((sample_count, 4), dtype=np.uint8)
+    aligned[:, 1:] = raw[:sample_count * 3].reshape(sample_count, 3)
+
+    samples = aligned.view('<i4').reshape(sample_count).astype(dtype)
+    samples *= scaling_factor
+    return samples
+
+
+# SampleType 3 is 32-bit signed integer data which must be scaled to a float.
+def decode_int32(data, scaling_factor, dtype=np.float64):
+    samples = np.frombuffer(data, dtype='<i4').astype(dtype)
+    samples *= scaling_factor
+    return samples
+
+
+# Decode the sampled data of an analog channel block.
+# The data must start directly after the Analog Channel Header, i.e. at the scaling factor for the raw SampleTypes.
+# Returns the decoded samples, the scaling factor (None for SampleType 0) and the number of bytes consumed.
+# Use dtype=np.float32 to halve the memory used by the raw SampleTypes, at the cost of a little precision.
+def decode_analog_block(sample_type, data, channel_data_size, dtype=None):
+    if sample_type == SAMPLE_TYPE_FLOAT32:
+        samples = decode_float32(data[:channel_data_size], np.float32 if dtype is None else dtype)
+        return samples, None, channel_data_size
+
+    if sample_type not in sample_sizes:
+        raise ValueError("Unknown SampleType: " + str(sample_type))
+
+    scaling_factor = scaling_factor_struct.unpack_from(data, 0)[0]
+    specific_data = data[4:4 + channel_data_size]
+
+    if dtype is None:
+        dtype = np.float64
+
+    if sample_type == SAMPLE_TYPE_INT16:
+        samples = decode_int16(specific_data, scaling_factor, dtype)
+    elif sample_type == SAMPLE_TYPE_INT24:
+        samples = decode_int24(specific_data, scaling_factor, dtype)
+    else:
+        samples = decode_int32(specific_data, scaling_factor, dtype)
+
+    return samples, scaling_factor, 4 + channel_data_size
@@ -0,0 +1,131 @@
+# QServer introduction to Python: A reusable client for the TCP data stream.
+# This combines the steps of the StreamData example into a class: check that the controller is online,
+# request the streaming port through /datastream/setup/, connect to it and decode the frames.
+# Frames are received with the StreamReceiver and decoded with a cached FramePlan.
+
+import socket
+import time
+import requests
+from FramePlan import FramePlanCache
+from StreamHealth import StreamHealth
+from StreamReceiver import StreamReceiver
+
+# The payload type of data payloads, other payload types are passed to the registered payload handlers.
+PAYLOAD_TYPE_DATA = 0
+
+# The byte order marker QServer sends when the data is little-endian.
+BYTE_ORDER_MARKER = 0xfffe
+
+
+class StreamClient:
+    # The channel filter is an optional FramePlan.ChannelFilter, only the selected channels are decoded.
+    # To feed several consumers with different filters from one stream, use a SubscriptionHub instead.
+    # The timeout in seconds applies to the HTTP requests and to connecting to the streaming port. Reading frames waits
+    # without a timeout, set one on the client_socket after connecting when a stalled stream must be detected.
+    def __init__(self, ip, port=8080, channel_filter=None, timeout=10.0):
+        self.ip = ip
+        self.url = "http://" + ip + ":" + str(port)
+        self.timeout = timeout
+        self.client_socket = None
+        self.receiver = None
+        self.plan_cache = FramePlanCache(channel_filter=channel_filter)
+
+        # Set a StreamRecorder here to capture every frame exactly as it was received.
+        # Frames the recorder drops, because it returned False, are counted in the health.
+        self.recorder = None
+
+        # The health of the stream: sequence gaps, buffer level, latency and the time spent per stage.
+        self.health = StreamHealth()
+
+        # The handlers of the other payload types, by PayloadType; see register_payload_handler.
+        self.payload_handlers = {}
+
+        # Set a function of (channel_plan, exception) here to skip channels which fail to decode, instead of failing the frame.
+        self.channel_error_handler = None
+
+    # Check if the system is online by sending a /info/ping/ request.
+    def ping(self):
+        response = requests.get(self.url + "/info/ping/", timeout=self.timeout)
+        return response.status_code == 200
+
+    # Request the port which is available for streaming.
+    def request_streaming_port(self):
+        response = requests.get(self.url + "/datastream/setup/", timeout=self.timeout)
+        if response.status_code != 200:
+            raise ConnectionError("Failed to receive datastream setup")
+        return response.json()["TCPPort"]
+
+    def connect(self):
+        if not self.ping():
+            raise ConnectionError("Server is offline")
+
+        streaming_port = self.request_streaming_port()
+        self.client_socket = socket.create_connection((self.ip, streaming_port), timeout=self.timeout)
+        self.client_socket.settimeout(None)
+        self.receiver = StreamReceiver(self.client_socket)
+
+    def close(self):
+        if self.client_socket is not None:
+            self.client_socket.close()
+            self.client_socket = None
+
+    # The handler is called with the StreamHeader and the payload for every payload of the given PayloadType.
+    # The payload is a memoryview on the receive buffer, which is overwritten by the next frame; copy what you keep.
+    def register_payload_handler(self, payload_type, handler):
+        self.payload_handlers[payload_type] = handler
+
+    # Call this after the settings were applied, the layout of the payload will be different from then on.
+    def invalidate_plan(self):
+        self.plan_cache.invalidate()
+
+    # Read the next frame from the stream.
+    # Returns a DecodedFrame for data payloads, or None if the payload was of another type.
+    def read_frame(self):
+        health = self.health
+        start = time.perf_counter()
+        header, payload = self.receiver.read_frame()
+        received = time.perf_counter()
+        health.add_stage_time("receive", received - start)
+        health.record_header(header, time.time())
+
+        if self.recorder is not None and self.recorder.record(header, payload) is False:
+            health.recording_drops += 1
+
+        if header.payload_type != PAYLOAD_TYPE_DATA:
+            handler = self.payload_handlers.get(header.payload_type)
+            if handler is not None:
+                handler(header, payload)
+            return None
+
+        if header.byte_order_marker != BYTE_ORDER_MARKER:
+            raise ValueError("Unknown byte order marker: " + hex(header.byte_order_marker))
+
+        frame = self.plan_cache.decode(header, payload, health, self.channel_error_handler)
+        health.add_stage_time("decode", time.perf_counter() - received)
+        return frame
+
+    # Iterate over the decoded data frames, optionally stopping after the given number of frames.
+    def frames(self, count=None):
+        received = 0
+        while count is None or received < count:
+            frame = self.read_frame()
+            if frame is None:
+                continue
+            received += 1
+            yield frame
+
+    # Decode the stream in parallel worker processes, see StreamPipeline for details.
+    # The pipeline takes over reading from the socket, hence read_frame must not be used while it is running.
+    # It uses the health, recorder, payload handlers, filters and channel error handler of this client.
+    def open_pipeline(self, worker_count=None, slot_count=None, batch_size=8):
+        from StreamPipeline import StreamPipeline
+        return StreamPipeline(self.receiver, worker_count, slot_count, batch_size=batch_size, health=self.health, recorder=self.recorder,
+                              payload_handlers=self.payload_handlers, can_ids=self.plan_cache.can_ids,
+                              channel_filter=self.plan_cache.channel_filter, channel_error_handler=self.channel_error_handler)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -5,7 +5,10 @@
 import socket
 import struct
 import requests
-from ctypes import c_long
+from CanDecoder import decode_can_messages
+from ChannelRingBuffer import ChannelStore
+from SampleDecoder import decode_analog_block
+from StreamReceiver import StreamReceiver
 
 ip = "192.168.100.47"
 url = "http://" + ip + ":8080"
@@ -35,9 +38,12 @@ streaming_port = datastream_setup["TCPPort"]
 # Next we need to open a TCP port to start streaming data.
 client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 client_socket.connect((ip, streaming_port))
+receiver = StreamReceiver(client_socket)
 
 # Lets loop for a while and read the data from the client socket.
-analog_channel_data = {}
+# The sampled data is kept in a ring buffer per channel, which holds the newest 1 000 000 samples of every channel.
+# Unlike a list that grows with every packet, the memory used stays the same no matter how long the stream runs.
+analog_channel_data = ChannelStore(capacity=1000000)
 for loop_count in range(500):
     print("Loop count:", loop_count + 1)
 
@@ -49,30 +55,30 @@ for loop_count in range(500):
     # - PayloadSize: The size of the data payload; 32-bit unsigned integer
     # - ByteOrderMarker: The byte order marker; 32-bit unsigned integer
     # - PayloadType: The type of the payload data; 32-bit unsigned integer
-    data = client_socket.recv(32)
-    sequence_number = struct.unpack('<Q', data[0:8])[0]
-    transmit_timestamp = struct.unpack('<d', data[8:16])[0]
-    buffer_level = struct.unpack('<f', data[16:20])[0]
-    payload_size = struct.unpack('<I', data[20:24])[0]
-    byte_order_marker = struct.unpack('<I', data[24:28])[0]
-    payload_type = struct.unpack('<I', data[28:32])[0]
+    # The socket may deliver fewer bytes than requested, hence the StreamReceiver keeps reading until the header is complete.
+    header = receiver.read_header()
+    sequence_number = header.sequence_number
+    transmit_timestamp = header.transmit_timestamp
+    buffer_level = header.buffer_level
+    payload_size = header.payload_size
+    byte_order_marker = header.byte_order_marker
+    payload_type = header.payload_type
 
     # This example will only deal with payload_type 0, which is the data payload.
     # If another type is delivered, then the data will be discarded.
     # we'll read the entire payload data in one go, then parse the bytes from this local buffer.
+    # The StreamReceiver reads the payload into a reusable buffer and returns a memoryview on it,
+    # hence slicing the payload below does not copy any bytes.
     index = 0
-    payload_data = client_socket.recv(payload_size)
-    while len(payload_data) < payload_size:
-        payload_data += client_socket.recv(payload_size - len(payload_data))
-
-    received_payload_size = len(payload_data)
+    payload_data = receiver.read_payload(header)
     if payload_type != 0:
         continue
 
     # You can also check the byte order marker here, if it is not 0xfffe then the endianness is different.
+    # Such a payload can not be parsed by this example, hence it is skipped.
     if byte_order_marker != 0xfffe:
         print("Unknown byte order marker")
-        exit()
+        continue
 
     # The payload structure consists of Generic Channel Headers for all channels that are enabled for streaming.
     # Following the Generic Channel Headers will be Specific Channel Headers followed by the actual sampled data.
@@ -111,52 +117,16 @@ for loop_count in range(500):
             max_value = struct.unpack('f', specific_data[16:20])[0]
 
             # Depending on the SampleType, as specified in the Generic Channel Header, there might be an additional field and the data format might change.
-            # Hence we need to read the data based on the SampleType.
-            if sample_type == 0:
-                # The SampleType 0 is for 32-bit floating point data.
-                specific_data = payload_data[index:index + channel_data_size]
-                index += channel_data_size
-                sampled_data = struct.unpack('f' * (channel_data_size // 4), specific_data)
-            
+            # - SampleType 0 is for 32-bit floating point data.
             # The following sample types will occur only when you configure the controller to deliver Raw Data.
-            elif sample_type == 1:
-                # The SampleType 1 is for 16-bit signed integer data.
-                # You'll have to read one additional field for the scaling factor, then read the data scaling it to a float yourself.
-                scaling_factor = struct.unpack('f', payload_data[index:index + 4])[0]
-                index += 4
-
-                specific_data = payload_data[index:index + channel_data_size]
-                index += channel_data_size
-
-                sampled_data = [scaling_factor * struct.unpack('h', specific_data[i:i + 2])[0] for i in range(0, len(specific_data), 2)]
-
-            elif sample_type == 2:
-                # The SampleType 2 is for 24-bit signed integer data.
-                # You'll have to read one additional field for the scaling factor, then read the data scaling it to a float yourself.
-                scaling_factor = struct.unpack('f', payload_data[index:index + 4])[0]
-                index += 4
-
-                specific_data = payload_data[index:index + channel_data_size]
-                index += channel_data_size
-
-                # Since python does not have a 24-bit integer type, we'll have to read the 24-bit data as a fixed length 32-bit signed integer and then scale it to a float.
-                # The ctypes library was used here to handle the 32-bit signed integer data.
-                sampled_data = []
-                for i in range(0, len(specific_data), 3):
-                    value = c_long((specific_data[i + 2] << 24) | (specific_data[i + 1] << 16) | (specific_data[i] << 8))
-                    sampled_data.append(scaling_factor * float(value.value))
-
-            elif sample_type == 3:
-                # The SampleType 3 is for 32-bit signed integer data.
-                # You'll have to read one additional field for the scaling factor, then read the data scaling it to a float yourself.
-                scaling_factor = struct.unpack('f', payload_data[index:index + 4])[0]
-                index += 4
-
-                specific_data = payload_data[index:index + channel_data_size]
-                index += channel_data_size
-
-                sampled_data = [scaling_factor * struct.unpack('i', specific_data[i:i + 4])[0] for i in range(0, len(specific_data), 4)]
-        
+            # For these you'll have to read one additional field for the scaling factor, then read the data scaling it to a float yourself.
+            # - SampleType 1 is for 16-bit signed integer data.
+            # - SampleType 2 is for 24-bit signed integer data.
+            # - SampleType 3 is for 32-bit signed integer data.
+            # Decoding the samples one at a time in Python is slow, hence the SampleDecoder module decodes the whole block at once using NumPy.
+            sampled_data, scaling_factor, consumed_size = decode_analog_block(sample_type, payload_data[index:], channel_data_size)
+            index += consumed_size
+
         elif channel_type == 1:
             # The Counter Channels (Tacho) does not have a specific header, hence we can directly read the data.
             specific_data = payload_data[index:index + channel_data_size]
@@ -177,36 +147,10 @@ for loop_count in range(500):
             # - Frame Type: The frame type of the message; 8-bit unsigned integer
             # - DLC: The data length code of the message; 8-bit unsigned integer
             # - Data: The data of the message; list of up to 64 bytes
-            message_list = []
-            message_end = index + channel_data_size
-            while index < message_end:
-                timestamp = struct.unpack('d', payload_data[index:index + 8])[0]
-                index += 8
-                message_id = struct.unpack('I', payload_data[index:index + 4])[0]
-                index += 4
-                header = struct.unpack('B', payload_data[index:index + 1])[0]
-                index += 1
-                frame_format = struct.unpack('B', payload_data[index:index + 1])[0]
-                index += 1
-                frame_type = struct.unpack('B', payload_data[index:index + 1])[0]
-                index += 1
-                dlc = struct.unpack('B', payload_data[index:index + 1])[0]
-                index += 1
-                data = list(payload_data[index:index + dlc])
-                index += dlc
-
-                message = {
-                    "Timestamp": timestamp,
-                    "ID": message_id,
-                    "Header": header,
-                    "Frame Format": frame_format,
-                    "Frame Type": frame_type,
-                    "DLC": dlc,
-                    "Data": data
-                }
-
-                message_list.append(message)
-
+            # Building a dictionary per message is slow on a busy bus, hence the CanDecoder module decodes all the messages at once.
+            # The result is a NumPy structured array with one row per message, e.g. message_list["id"] holds all the IDs.
+            # Pass an ID filter from make_id_filter as the second argument to only decode the messages you need.
+            message_list = decode_can_messages(payload_data[index:index + channel_data_size])
             index += channel_data_size
 
         elif channel_type == 3:
@@ -221,18 +165,18 @@ for loop_count in range(500):
             leapSeconds = struct.unpack('B', specific_data[11:12])[0]
 
             # Now read the GPS message, it formatted in ASCII and always end with a /r/n, 
-            gpsMessage = payload_data[index:index + channel_data_size].decode('ascii')
+            gpsMessage = str(payload_data[index:index + channel_data_size], 'ascii')
             index += channel_data_size
             print(gpsMessage)
         else:
+            # A ChannelType this example does not know, skip its data using the ChannelDataSize.
             print("Unknown Channel Type: ", channel_type)
-            exit()
-
-        # Store the sampled data in a dictionary with channel_id as the key
-        if channel_id not in analog_channel_data:
-            analog_channel_data[channel_id] = []
+            index += channel_data_size
 
-        analog_channel_data[channel_id].append(sampled_data)
+        # Store the sampled data of the Analog and Counter Channels in the ring buffer of the channel.
+        # Use analog_channel_data[channel_id].latest(n) or .window(t0, t1) to access the data later.
+        if channel_type == 0 or channel_type == 1:
+            analog_channel_data.append(channel_id, sampled_data, timestamp)
 
 client_socket.close()
 
@@ -0,0 +1,187 @@
+# QServer introduction to Python: Monitoring the health of the data stream.
+# Every frame header carries a SequenceNumber, TransmitTimestamp and BufferLevel. Keeping track of them tells you when
+# data was lost, how full the controller's buffer is and how far behind the client is, before the controller overflows.
+# The StreamHealth object collects:
+# - Sequence gaps, duplicates and restarts, from the SequenceNumber.
+# - A time series of the BufferLevel, with callbacks when it rises above a high watermark.
+# - A histogram of the latency from the TransmitTimestamp until the frame was received.
+# - The time spent per stage: receiving, decoding (per ChannelType when detailed timing is enabled) and storage.
+# A snapshot of all counters is available as a dictionary or in the Prometheus text format.
+
+import bisect
+import os
+import time
+from contextlib import contextmanager
+from ChannelRingBuffer import ChannelRingBuffer
+
+# The upper bounds of the latency histogram buckets in seconds, the last bucket holds everything above.
+LATENCY_BUCKETS = [0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
+
+CHANNEL_TYPE_NAMES = {0: "analog", 1: "counter", 2: "can", 3: "gps"}
+
+
+class StageTimes:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+
+class StreamHealth:
+    # The buffer level history is the number of BufferLevel values kept.
+    # With detailed timing enabled, the decode time is measured per channel instead of per frame, which costs a little more.
+    # A SequenceNumber more than the restart window below the expected one means the controller restarted its numbering,
+    # e.g. after a reboot; counting starts again from that frame. A smaller step back is counted as a duplicate.
+    def __init__(self, buffer_level_history=10000, detailed_timing=False, restart_window=1000):
+        self.detailed_timing = detailed_timing
+        self.restart_window = restart_window
+        self.frame_count = 0
+        self.expected_sequence_number = None
+        self.gap_count = 0
+        self.missing_frames = 0
+        self.duplicate_count = 0
+        self.restart_count = 0
+
+        # Frames the StreamRecorder left out of the capture because its writer fell behind.
+        self.recording_drops = 0
+
+        self.buffer_levels = ChannelRingBuffer(buffer_level_history)
+        self.buffer_level_watermarks = []
+        self.buffer_level = 0.0
+        self.peak_buffer_level = 0.0
+
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_total = 0.0
+
+        self.stages = {}
+
+        # A profiling hook is called with the stage name and duration of every measurement; keep it cheap.
+        self.profile_hook = None
+
+    # Call the callback with the BufferLevel when it rises above the watermark. It is called once per crossing,
+    # and again only after the level dropped below the watermark in between.
+    def add_buffer_level_watermark(self, watermark, callback):
+        self.buffer_level_watermarks.append([watermark, callback, False])
+
+    # Forget the expected SequenceNumber, the next frame starts the counting again without being taken for a gap or a
+    # duplicate. Call this when the numbering is known to start over, e.g. after connecting to another controller.
+    def reset(self):
+        self.expected_sequence_number = None
+
+    # Record the header of a received frame; the receive time is the time.time() at which the frame arrived.
+    def record_header(self, header, receive_time):
+        self.frame_count += 1
+
+        sequence_number = header.sequence_number
+        expected = self.expected_sequence_number
+        if expected is not None and sequence_number < expected - self.restart_window:
+            self.restart_count += 1
+            self.reset()
+            expected = None
+        if expected is None or sequence_number >= expected:
+            if expected is not None and sequence_number > expected:
+                self.gap_count += 1
+                self.missing_frames += sequence_number - expected
+            self.expected_sequence_number = sequence_number + 1
+        else:
+            self.duplicate_count += 1
+
+        buffer_level = header.buffer_level
+        self.buffer_level = buffer_level
+        if buffer_level > self.peak_buffer_level:
+            self.peak_buffer_level = buffer_level
+        self.buffer_levels.append((buffer_level,), receive_time)
+        for watermark in self.buffer_level_watermarks:
+            above = buffer_level >= watermark[0]
+            if above and not watermark[2]:
+                watermark[1](buffer_level)
+            watermark[2] = above
+
+        latency = receive_time - header.transmit_timestamp
+        self.latency_counts[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.latency_total += latency
+
+    def add_stage_time(self, stage, seconds):
+        stage_times = self.stages.get(stage)
+        if stage_times is None:
+            stage_times = self.stages[stage] = StageTimes()
+        stage_times.add(seconds)
+        if self.profile_hook is not None:
+            self.profile_hook(stage, seconds)
+
+    # Time a block of code as a stage, e.g. "with health.stage('storage'): store.append_frame(frame)".
+    @contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage_time(stage, time.perf_counter() - start)
+
+    # The decode time of a single channel, used by the FramePlan when detailed timing is enabled.
+    def add_decode_time(self, channel_type, seconds):
+        self.add_stage_time("decode_" + CHANNEL_TYPE_NAMES.get(channel_type, str(channel_type)), seconds)
+
+    def snapshot(self):
+        return {
+            "Frames": self.frame_count,
+            "SequenceGaps": self.gap_count,
+            "MissingFrames": self.missing_frames,
+            "Duplicates": self.duplicate_count,
+            "Restarts": self.restart_count,
+            "RecordingDrops": self.recording_drops,
+            "BufferLevel": self.buffer_level,
+            "PeakBufferLevel": self.peak_buffer_level,
+            "LatencyBuckets": dict(zip([str(bucket) for bucket in LATENCY_BUCKETS] + ["+Inf"], self.latency_counts)),
+            "LatencyMean": self.latency_total / self.frame_count if self.frame_count else 0.0,
+            "Stages": {stage: {"Count": times.count, "TotalSeconds": times.total, "MaxSeconds": times.maximum} for stage, times in self.stages.items()},
+        }
+
+    # The snapshot in the Prometheus text exposition format.
+    def to_prometheus(self, prefix="qserver_stream"):
+        lines = []
+
+        def metric(name, metric_type, value, labels=""):
+            if metric_type is not None:
+                lines.append("# TYPE " + prefix + "_" + name + " " + metric_type)
+            lines.append(prefix + "_" + name + labels + " " + repr(float(value)))
+
+        metric("frames_total", "counter", self.frame_count)
+        metric("sequence_gaps_total", "counter", self.gap_count)
+        metric("missing_frames_total", "counter", self.missing_frames)
+        metric("duplicate_frames_total", "counter", self.duplicate_count)
+        metric("sequence_restarts_total", "counter", self.restart_count)
+        metric("recording_dropped_frames_total", "counter", self.recording_drops)
+        metric("buffer_level", "gauge", self.buffer_level)
+        metric("buffer_level_peak", "gauge", self.peak_buffer_level)
+
+        lines.append("# TYPE " + prefix + "_latency_seconds histogram")
+        cumulative = 0
+        for bucket, count in zip([repr(bucket) for bucket in LATENCY_BUCKETS] + ["+Inf"], self.latency_counts):
+            cumulative += count
+            metric("latency_seconds_bucket", None, cumulative, '{le="' + bucket + '"}')
+        metric("latency_seconds_sum", None, self.latency_total)
+        metric("latency_seconds_count", None, self.frame_count)
+
+        if self.stages:
+            lines.append("# TYPE " + prefix + "_stage_seconds_total counter")
+            lines.append("# TYPE " + prefix + "_stage_calls_total counter")
+            lines.append("# TYPE " + prefix + "_stage_seconds_max gauge")
+        for stage, times in self.stages.items():
+            labels = '{stage="' + stage + '"}'
+            metric("stage_seconds_total", None, times.total, labels)
+            metric("stage_calls_total", None, times.count, labels)
+            metric("stage_seconds_max", None, times.maximum, labels)
+        return "\n".join(lines) + "\n"
+
+    # Write the Prometheus text to a file, e.g. for the node exporter's textfile collector.
+    def write_prometheus(self, path, prefix="qserver_stream"):
+        with open(path + ".tmp", "w") as metrics_file:
+            metrics_file.write(self.to_prometheus(prefix))
+        os.replace(path + ".tmp", path)
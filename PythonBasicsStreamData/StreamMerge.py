@@ -0,0 +1,173 @@
+# QServer introduction to Python: Merging the channels of several streams onto a common timebase.
+# When several controllers or modules stream at different sample rates, their channel blocks arrive at different moments
+# and cover different stretches of time. The StreamMerge takes the decoded frames of all streams as they arrive and
+# emits AlignedBlocks: consecutive stretches of time with the samples of every channel in that stretch.
+# - Every sample gets its own timestamp: the Timestamp of its block plus its position times the sample period.
+# - A block is emitted as soon as every channel has delivered data beyond its end, i.e. when the slowest stream has
+#   caught up; this is a k-way merge on the newest timestamp of every channel.
+# - The channels to wait for are known up front, so a stream which has not delivered anything yet holds up the output
+#   as well. The lookahead bounds the memory: a channel that lags more than the lookahead behind the newest data, or has
+#   not delivered any data at all, no longer holds up the output; its part of the blocks is left empty (NaN when resampling).
+# - With an output rate all channels are resampled onto the same timestamps, ready to be put in a single 2D array.
+#   Without one, every channel keeps its own samples and timestamps within the block.
+#
+# Timestamps are large numbers of ticks (nanoseconds since the epoch), which do not fit a float64 exactly. Hence every
+# block holds its start as an integer, and the timestamps within the block relative to that start.
+
+from collections import namedtuple
+import numpy as np
+from FramePlan import CHANNEL_TYPE_ANALOG, CHANNEL_TYPE_COUNTER
+
+RESAMPLE_LINEAR = "linear"
+RESAMPLE_HOLD = "hold"
+
+# The channels are keyed by (stream, ChannelId). When resampling, every channel holds just its samples and all share the
+# timestamps of the block; otherwise every channel holds its own (timestamps, samples).
+AlignedBlock = namedtuple("AlignedBlock", ["start", "duration", "timestamps", "channels"])
+
+
+# The buffered samples of a single channel, with timestamps relative to the origin of the merge.
+class ChannelTrack:
+    def __init__(self, sample_period):
+        self.sample_period = sample_period
+        self.timestamps = np.zeros(0)
+        self.samples = np.zeros(0)
+
+    def append(self, samples, timestamp):
+        samples = np.asarray(samples, dtype=np.float64)
+        timestamps = timestamp + np.arange(len(samples)) * self.sample_period
+        self.timestamps = np.concatenate((self.timestamps, timestamps))
+        self.samples = np.concatenate((self.samples, samples))
+
+    # The time up to which this channel has delivered its data.
+    def end(self):
+        return self.timestamps[-1] + self.sample_period if len(self.timestamps) else None
+
+    # The samples in [t0, t1).
+    def window(self, t0, t1):
+        first, last = np.searchsorted(self.timestamps, (t0, t1))
+        return self.timestamps[first:last], self.samples[first:last]
+
+    # The samples interpolated at the given timestamps; outside the buffered data the result is NaN.
+    def resample(self, timestamps, method):
+        result = np.full(len(timestamps), np.nan)
+        if not len(self.timestamps):
+            return result
+        inside = (timestamps >= self.timestamps[0]) & (timestamps < self.end())
+        if method == RESAMPLE_LINEAR:
+            result[inside] = np.interp(timestamps[inside], self.timestamps, self.samples)
+        else:
+            positions = np.searchsorted(self.timestamps, timestamps[inside], side="right") - 1
+            result[inside] = self.samples[positions]
+        return result
+
+    # Drop the samples before the given time; the last of them is kept for the interpolation of the next block.
+    def discard(self, time):
+        first = max(int(np.searchsorted(self.timestamps, time)) - 1, 0)
+        self.timestamps = self.timestamps[first:]
+        self.samples = self.samples[first:]
+
+
+class StreamMerge:
+    # The sample rates are given per ChannelId, or per (stream, ChannelId) when the streams use the same ChannelIds.
+    # The ticks per second convert the sample rates to the unit of the Timestamp field, e.g. 1e9 for nanosecond timestamps.
+    # The block duration and the lookahead are in ticks as well.
+    # The output rate in samples per second is optional, with it every block is resampled using the given method.
+    # The channels to merge are the (stream, ChannelId) keys of the sample rates, or the given list of expected keys
+    # when the sample rates are given per ChannelId. Channels of other keys are merged as well once they deliver data.
+    def __init__(self, sample_rates, ticks_per_second, block_duration, lookahead=None, output_rate=None, method=RESAMPLE_LINEAR,
+                 expected_keys=None):
+        self.sample_rates = sample_rates
+        self.ticks_per_second = ticks_per_second
+        self.block_duration = block_duration
+        self.lookahead = lookahead if lookahead is not None else 10 * block_duration
+        self.output_rate = output_rate
+        self.method = method
+        self.tracks = {}
+        if expected_keys is None:
+            expected_keys = [key for key in sample_rates if isinstance(key, tuple)]
+        for key in expected_keys:
+            self.tracks[key] = self.create_track(key)
+        self.origin = None
+        self.next_start = None
+
+    def create_track(self, key):
+        sample_rate = self.sample_rates.get(key, self.sample_rates.get(key[1]))
+        if not sample_rate:
+            raise ValueError("No sample rate for stream " + str(key[0]) + ", ChannelId " + str(key[1]))
+        return ChannelTrack(self.ticks_per_second / sample_rate)
+
+    # Add a block of samples of a channel; returns the list of AlignedBlocks which became complete.
+    def add(self, stream, channel_id, samples, timestamp):
+        if self.origin is None:
+            # The first block starts at a multiple of the block duration, so different runs get the same block boundaries.
+            self.origin = int(timestamp) - int(timestamp) % int(self.block_duration)
+            self.next_start = 0.0
+
+        key = (stream, channel_id)
+        track = self.tracks.get(key)
+        if track is None:
+            track = self.tracks[key] = self.create_track(key)
+        track.append(samples, float(int(timestamp) - self.origin))
+        return self.emit_ready()
+
+    # Add the Analog and Counter Channels of a DecodedFrame received from the given stream.
+    def add_frame(self, stream, frame):
+        blocks = []
+        for channel in frame.channels:
+            if channel.channel_type in (CHANNEL_TYPE_ANALOG, CHANNEL_TYPE_COUNTER):
+                blocks += self.add(stream, channel.channel_id, channel.data, channel.timestamp)
+        return blocks
+
+    # Merge an iterable of (stream, frame) pairs, e.g. frames tagged with their controller; yields the AlignedBlocks.
+    def merge(self, frames):
+        for stream, frame in frames:
+            yield from self.add_frame(stream, frame)
+        yield from self.flush()
+
+    def emit_ready(self):
+        ends = [track.end() for track in self.tracks.values()]
+        delivered = [end for end in ends if end is not None]
+        if not delivered:
+            return []
+        # A channel without any data yet holds up the output like a lagging one,
+        # and a lagging channel may hold up the output for no longer than the lookahead.
+        ready = min(delivered) if len(delivered) == len(ends) else -np.inf
+        ready = max(ready, max(delivered) - self.lookahead)
+
+        blocks = []
+        while self.next_start + self.block_duration <= ready:
+            blocks.append(self.emit_block())
+        return blocks
+
+    def emit_block(self):
+        t0 = self.next_start
+        t1 = t0 + self.block_duration
+        if self.output_rate:
+            period = self.ticks_per_second / self.output_rate
+            first = np.ceil(t0 / period)
+            timestamps = np.arange(first, np.ceil(t1 / period)) * period
+            channels = {key: track.resample(timestamps, self.method) for key, track in self.tracks.items()}
+            timestamps -= t0
+        else:
+            timestamps = None
+            channels = {}
+            for key, track in self.tracks.items():
+                channel_timestamps, samples = track.window(t0, t1)
+                channels[key] = (channel_timestamps - t0, samples.copy())
+
+        for track in self.tracks.values():
+            track.discard(t1)
+        self.next_start = t1
+        return AlignedBlock(self.origin + int(t0), self.block_duration, timestamps, channels)
+
+    # Emit the remaining data at the end of the streams, the last block may be partly empty.
+    def flush(self):
+        ends = [end for end in (track.end() for track in self.tracks.values()) if end is not None]
+        if not ends:
+            return []
+        end = max(ends)
+        blocks = []
+        while self.next_start < end:
+            blocks.append(self.emit_block())
+        return blocks
@@ -0,0 +1,320 @@
+# QServer introduction to Python: Decoding the data stream in parallel.
+# In a single loop the socket is not read while a payload is being decoded. If decoding is slow, the controller's
+# BufferLevel climbs until it overflows. The pipeline splits the work in three stages:
+# - A reader thread only reads raw frames from the socket into a pool of shared memory slots.
+# - Worker processes decode the payloads from the shared memory slots in parallel.
+# - A sequencer hands the decoded frames back in the order they were received, which is SequenceNumber order.
+# The payload is written into shared memory once by the reader and read in place by a worker, hence it is never pickled.
+# The worker writes the decoded arrays into the same slot, behind the payload, and only sends back where they are, so the
+# samples are not pickled either. Frames which are read back to back are handed to the workers as one task, hence the
+# cost of a task is shared by all the frames in it. The tasks and results go through plain queues rather than a
+# multiprocessing.Pool, which would add three handler threads to the process that also reads the socket.
+# The pipeline does the same as StreamClient.read_frame: the reader thread records the StreamHealth, passes the frames to
+# the StreamRecorder and the other payload types to their handlers, and the workers use the CAN ID and channel filters.
+# The filters are sent to the worker processes, hence they have to be picklable, e.g. a ChannelFilter.
+
+import heapq
+import multiprocessing
+import queue
+import select
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from FramePlan import DecodedChannel, DecodedFrame, FramePlanCache
+from StreamClient import BYTE_ORDER_MARKER, PAYLOAD_TYPE_DATA
+
+# Every slot has room for decoded arrays of up to OUTPUT_FACTOR times the PayloadSize behind the payload, which covers
+# 16-bit samples decoded to 64-bit floating point. Arrays which do not fit, such as CAN messages with only a few data
+# bytes, are sent back through the pool instead.
+OUTPUT_FACTOR = 4
+
+# Every worker process keeps its own plan cache and its own mapping of the shared memory slots, by slot index.
+worker_plan_cache = None
+worker_isolate_errors = False
+worker_slots = {}
+
+
+# The offset of the first decoded array behind a payload, aligned for any dtype.
+def output_offset(payload_size):
+    return (payload_size + 63) // 64 * 64
+
+
+def init_worker(can_ids, channel_filter, isolate_errors):
+    global worker_plan_cache, worker_isolate_errors
+    worker_plan_cache = FramePlanCache(can_ids, channel_filter)
+    worker_isolate_errors = isolate_errors
+
+
+# Map a slot; a slot which was replaced by a larger one has a new name, the mapping of the old one is then closed.
+def attach_slot(slot_index, slot_name):
+    slot = worker_slots.get(slot_index)
+    if slot is not None and slot.name != slot_name:
+        slot.close()
+        slot = None
+    if slot is None:
+        slot = shared_memory.SharedMemory(name=slot_name)
+        worker_slots[slot_index] = slot
+    return slot
+
+
+# Decode the payload stored in a shared memory slot, this runs in the worker processes.
+# Returns the decoded channels as plain tuples, the end of the decoded arrays in the slot, and the channels which failed
+# to decode, as (ChannelPlan, exception) when errors are isolated. The arrays which fit in the slot are replaced by their
+# (offset, dtype, shape) in the channel tuples, and listed by channel number in the shared list.
+def decode_slot(slot_index, slot_name, header):
+    global worker_plan_cache
+    if worker_plan_cache is None:
+        worker_plan_cache = FramePlanCache()
+
+    channel_errors = []
+    on_error = None
+    if worker_isolate_errors:
+        # The decoder of the ChannelPlan is a function defined in the worker, which can not be sent back.
+        on_error = lambda channel, error: channel_errors.append((channel._replace(decoder=None), error))
+
+    slot = attach_slot(slot_index, slot_name)
+    payload = slot.buf[:header.payload_size]
+    try:
+        channels = worker_plan_cache.decode(header, payload, on_error=on_error).channels
+    finally:
+        payload.release()
+
+    # Plain tuples are sent back rather than the DecodedChannel, which the consumer would otherwise build twice.
+    channels = [tuple(channel) for channel in channels]
+    shared = []
+    position = output_offset(header.payload_size)
+    for number, channel in enumerate(channels):
+        data = channel[-1]
+        if isinstance(data, np.ndarray) and position + data.nbytes <= slot.size:
+            np.ndarray(data.shape, data.dtype, buffer=slot.buf, offset=position)[...] = data
+            channels[number] = channel[:-1] + ((position, data.dtype, data.shape),)
+            shared.append(number)
+            position = output_offset(position + data.nbytes)
+    return channels, shared, position, channel_errors
+
+
+# The main loop of a worker process: decode the batches of (frame index, slot index, slot name, header) from the task
+# queue until it gets None, and send back every batch with its results, or with the error it failed with.
+def run_worker(tasks, decoded, can_ids, channel_filter, isolate_errors):
+    init_worker(can_ids, channel_filter, isolate_errors)
+    while True:
+        batch = tasks.get()
+        if batch is None:
+            return
+        try:
+            decoded.put(("frames", batch, [decode_slot(slot_index, slot_name, header) for _, slot_index, slot_name, header in batch]))
+        except Exception as error:
+            decoded.put(("error", batch, error))
+
+
+class StreamPipeline:
+    # The receiver is a StreamReceiver connected to the data stream.
+    # The slot count bounds the number of frames in flight, from reading until the consumer takes the decoded frame;
+    # when all slots are busy the reader waits for a worker or the consumer.
+    # Up to the batch size frames are handed to a worker as one task. A batch is handed over as soon as no more data is
+    # waiting on the socket, hence batching does not delay the frames of a stream which is keeping up.
+    # The health, recorder, payload handlers, filters and channel error handler are those of the StreamClient.
+    def __init__(self, receiver, worker_count=None, slot_count=None, slot_size=1024 * 1024, batch_size=8, health=None,
+                 recorder=None, payload_handlers=None, can_ids=None, channel_filter=None, channel_error_handler=None):
+        self.receiver = receiver
+        self.batch_size = batch_size
+        self.health = health
+        self.recorder = recorder
+        self.payload_handlers = payload_handlers or {}
+        self.can_ids = can_ids
+        self.channel_filter = channel_filter
+        self.channel_error_handler = channel_error_handler
+        self.worker_count = worker_count or multiprocessing.cpu_count()
+        self.slot_count = slot_count or self.worker_count * 4
+        self.slot_size = slot_size
+
+        self.slots = []
+        self.free_slots = queue.Queue()
+        self.tasks = None
+        self.decoded = None
+        self.workers = []
+        self.reader_thread = None
+        self.reader_end = None
+        self.stopping = threading.Event()
+
+    # The workers are started before the slots are created, a forked worker would otherwise inherit a mapping of every
+    # slot, which it keeps after the slot is replaced. The resource tracker is started first, so the workers share it
+    # rather than each starting one which unlinks the slots when the worker exits.
+    def start(self):
+        resource_tracker.ensure_running()
+        # The reader writes the tasks itself, the workers send the decoded frames straight to the consumer.
+        self.tasks = multiprocessing.SimpleQueue()
+        self.decoded = multiprocessing.Queue()
+        for _ in range(self.worker_count):
+            worker = multiprocessing.Process(target=run_worker, daemon=True,
+                                             args=(self.tasks, self.decoded, self.can_ids, self.channel_filter, self.channel_error_handler is not None))
+            worker.start()
+            self.workers.append(worker)
+
+        for slot_index in range(self.slot_count):
+            self.slots.append(shared_memory.SharedMemory(create=True, size=self.slot_size))
+            self.free_slots.put(slot_index)
+        self.reader_thread = threading.Thread(target=self.read_frames, name="StreamPipelineReader", daemon=True)
+        self.reader_thread.start()
+
+    # Replace a slot which is too small for the payload and its decoded arrays, the workers attach to the new slot by its name.
+    def reserve_slot(self, slot_index, payload_size):
+        slot = self.slots[slot_index]
+        size = output_offset(payload_size) + OUTPUT_FACTOR * payload_size
+        if size > slot.size:
+            slot.close()
+            slot.unlink()
+            slot = shared_memory.SharedMemory(create=True, size=size)
+            self.slots[slot_index] = slot
+        return slot
+
+    # Check if more data is waiting on the socket, without blocking.
+    def data_pending(self):
+        return bool(select.select([self.receiver.client_socket], [], [], 0)[0])
+
+    # The reader thread: read frames into free slots and hand them to the workers in batches.
+    # The batch is handed over before the reader would wait, for data on the socket or for a free slot, so a frame is
+    # never held back while the reader is idle.
+    # When the reader stops, it leaves the number of frames it submitted and the reason it stopped in reader_end.
+    def read_frames(self):
+        frame_index = 0
+        reader_error = None
+        batch = []
+        try:
+            while not self.stopping.is_set():
+                if batch and (len(batch) >= self.batch_size or not self.data_pending()):
+                    self.submit(batch)
+                    batch = []
+                header = self.receiver.read_header()
+                try:
+                    slot_index = self.free_slots.get_nowait()
+                except queue.Empty:
+                    if batch:
+                        self.submit(batch)
+                        batch = []
+                    slot_index = self.free_slots.get()
+                slot = self.reserve_slot(slot_index, header.payload_size)
+                payload = slot.buf[:header.payload_size]
+                try:
+                    self.receiver.receive_into(payload)
+                    if self.health is not None:
+                        self.health.record_header(header, time.time())
+                    if self.recorder is not None and self.recorder.record(header, payload) is False and self.health is not None:
+                        self.health.recording_drops += 1
+
+                    # Only data payloads are decoded, the other payload types are passed to their handlers.
+                    if header.payload_type != PAYLOAD_TYPE_DATA:
+                        handler = self.payload_handlers.get(header.payload_type)
+                        if handler is not None:
+                            handler(header, payload)
+                finally:
+                    payload.release()
+
+                if header.payload_type != PAYLOAD_TYPE_DATA:
+                    self.free_slots.put(slot_index)
+                    continue
+
+                if header.byte_order_marker != BYTE_ORDER_MARKER:
+                    raise ValueError("Unknown byte order marker: " + hex(header.byte_order_marker))
+
+                batch.append((frame_index, slot_index, header))
+                frame_index += 1
+        except Exception as error:
+            if not self.stopping.is_set():
+                reader_error = error
+        # The frames read before the reader stopped are still decoded.
+        if batch and not self.stopping.is_set():
+            self.submit(batch)
+        self.reader_end = (frame_index, reader_error)
+        self.decoded.put(("end", None, None))
+
+    # Hand a batch of (frame index, slot index, header) to the workers.
+    # The slot of a decoded frame stays in use until the consumer took the frame, see frames.
+    def submit(self, batch):
+        self.tasks.put([(frame_index, slot_index, self.slots[slot_index].name, header) for frame_index, slot_index, header in batch])
+
+    # Copy the arrays a worker wrote into a slot out of shared memory, since the slot is reused for a later frame.
+    # All the arrays of the frame are copied at once, the arrays handed out are views on that copy.
+    def load_channels(self, slot_index, header, channels, shared, end):
+        if shared:
+            start = output_offset(header.payload_size)
+            output = np.frombuffer(self.slots[slot_index].buf, np.uint8, end - start, start).copy()
+            for number in shared:
+                channel = channels[number]
+                offset, dtype, shape = channel[-1]
+                channels[number] = channel[:-1] + (np.ndarray(shape, dtype, buffer=output, offset=offset - start),)
+        return [DecodedChannel._make(channel) for channel in channels]
+
+    # A worker which died, for example from a crash in a decoder, would leave its frames undecoded forever.
+    def check_workers(self):
+        for worker in self.workers:
+            if not worker.is_alive():
+                raise RuntimeError("A StreamPipeline worker exited with code " + str(worker.exitcode))
+
+    # The sequencer: iterate over the decoded frames in the order they were received.
+    # The workers may finish out of order, hence finished frames wait in a heap until all earlier frames are done.
+    # When the reader stops, for example because the connection was closed, the frames already read are still
+    # returned before the reader's error is raised.
+    # The slot of a frame is freed when the next frame is requested, hence a slow consumer holds up the reader instead
+    # of collecting decoded frames in memory.
+    def frames(self):
+        pending = []
+        next_index = 0
+        end_index = None
+        end_error = None
+        while end_index is None or next_index < end_index:
+            try:
+                kind, batch, value = self.decoded.get(timeout=1.0)
+            except queue.Empty:
+                self.check_workers()
+                continue
+            if kind == "end":
+                end_index, end_error = self.reader_end
+            elif kind == "error":
+                for _, slot_index, _, _ in batch:
+                    self.free_slots.put(slot_index)
+                raise value
+            else:
+                for (frame_index, slot_index, _, header), result in zip(batch, value):
+                    heapq.heappush(pending, (frame_index, slot_index, header, result))
+                while pending and pending[0][0] == next_index:
+                    _, slot_index, header, (channels, shared, end, channel_errors) = heapq.heappop(pending)
+                    for channel, error in channel_errors:
+                        self.channel_error_handler(channel, error)
+                    yield DecodedFrame(header, self.load_channels(slot_index, header, channels, shared, end))
+                    self.free_slots.put(slot_index)
+                    next_index += 1
+
+        if end_error is not None:
+            raise end_error
+
+    def stop(self):
+        self.stopping.set()
+        if self.workers:
+            for _ in self.workers:
+                self.tasks.put(None)
+            for worker in self.workers:
+                worker.join(timeout=1.0)
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+            self.workers = []
+            # Frames left in the queue are dropped, exiting must not wait for them to be taken.
+            self.decoded.cancel_join_thread()
+            self.decoded.close()
+        for slot in self.slots:
+            try:
+                slot.close()
+            except BufferError:
+                # The reader thread may still be writing into the slot, the mapping is released when it exits.
+                pass
+            slot.unlink()
+        self.slots = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,64 @@
+# QServer introduction to Python: Receiving frames from the TCP data stream without copying.
+# A TCP socket may return fewer bytes than requested, hence both the header and the payload must be read in a loop.
+# Rather than growing a bytes object on every partial read, this module reads straight into a preallocated bytearray
+# using recv_into. The buffer is reused for every frame, and the payload is handed out as a memoryview on that buffer.
+
+import struct
+from collections import namedtuple
+
+# The first 32 bytes of every frame contain the header information:
+# - SequenceNumber: The sequence number of the data packet; 64-bit unsigned integer
+# - TransmitTimestamp: The system timestamp for when the data packet was sent; 64-bit floating point
+# - BufferLevel: The buffer level of the controller; 32-bit floating point
+# - PayloadSize: The size of the data payload; 32-bit unsigned integer
+# - ByteOrderMarker: The byte order marker; 32-bit unsigned integer
+# - PayloadType: The type of the payload data; 32-bit unsigned integer
+header_struct = struct.Struct('<QdfIII')
+HEADER_SIZE = header_struct.size
+
+StreamHeader = namedtuple("StreamHeader", ["sequence_number", "transmit_timestamp", "buffer_level", "payload_size", "byte_order_marker", "payload_type"])
+
+
+class StreamReceiver:
+    # The initial payload capacity is only a starting point, the buffer grows to the largest PayloadSize received.
+    def __init__(self, client_socket, initial_capacity=1024 * 1024):
+        self.client_socket = client_socket
+        self.header_buffer = bytearray(HEADER_SIZE)
+        self.header_view = memoryview(self.header_buffer)
+        self.payload_buffer = bytearray(initial_capacity)
+        self.payload_view = memoryview(self.payload_buffer)
+
+    # Fill the given memoryview completely, looping until the socket has delivered all the bytes.
+    def receive_into(self, view):
+        received = 0
+        size = len(view)
+        while received < size:
+            count = self.client_socket.recv_into(view[received:], size - received)
+            if count == 0:
+                raise ConnectionError("Connection closed by QServer")
+            received += count
+
+    # Make sure the payload buffer can hold the given PayloadSize.
+    # The buffer is only replaced when a larger payload arrives, hence this rarely allocates once the stream is running.
+    def reserve(self, payload_size):
+        if payload_size > len(self.payload_buffer):
+            self.payload_buffer = bytearray(payload_size)
+            self.payload_view = memoryview(self.payload_buffer)
+
+    # Read the 32-byte header of the next frame.
+    def read_header(self):
+        self.receive_into(self.header_view)
+        return StreamHeader._make(header_struct.unpack_from(self.header_buffer, 0))
+
+    # Read the payload described by the header into the reusable buffer.
+    # The returned memoryview is only valid until the next frame is read, copy it if you need to keep the raw bytes.
+    def read_payload(self, header):
+        self.reserve(header.payload_size)
+        payload = self.payload_view[:header.payload_size]
+        self.receive_into(payload)
+        return payload
+
+    # Read a complete frame; returns the header and a memoryview of the payload.
+    def read_frame(self):
+        header = self.read_header()
+        return header, self.read_payload(header)
@@ -0,0 +1,234 @@
+# QServer introduction to Python: Recording the data stream and replaying it without the hardware.
+# The recorder appends every frame, the 32-byte header followed by the payload exactly as it was received, to capture files.
+# The capture is split into segments which are preallocated and written through mmap. A sidecar index stores the
+# SequenceNumber, segment, offset and TransmitTimestamp of every frame, so a replay can seek to any frame directly.
+# Writing happens on a background thread, hence a slow disk does not keep the stream client from draining the socket.
+# When the disk falls behind and the queue is full, frames are left out of the capture and counted rather than
+# stalling the stream client; they show up as missing SequenceNumbers in the replay.
+# The index is flushed every few frames, so the capture of a session that crashed can still be replayed up to that point.
+
+import mmap
+import os
+import queue
+import threading
+import time
+import numpy as np
+from FramePlan import FramePlanCache
+from StreamClient import PAYLOAD_TYPE_DATA
+from StreamReceiver import HEADER_SIZE, StreamHeader, header_struct
+
+INDEX_FILE_NAME = "index.bin"
+
+# A record in the sidecar index: SequenceNumber, segment number, offset in the segment and TransmitTimestamp.
+index_dtype = np.dtype([("sequence_number", "<u8"), ("segment", "<u4"), ("offset", "<u8"), ("transmit_timestamp", "<f8")])
+
+
+def segment_file_name(segment):
+    return "segment_{:05d}.qsc".format(segment)
+
+
+class StreamRecorder:
+    # The segment size is the size each capture file is preallocated to, the last segment is trimmed when closed.
+    # The queue size bounds the number of frames waiting to be written.
+    # The index is flushed to the file every flush interval frames.
+    # With block enabled, a full queue makes record wait for the writer instead of dropping the frame. Every frame is
+    # then captured, at the risk of the controller's buffer filling up while the stream client waits.
+    def __init__(self, directory, segment_size=256 * 1024 * 1024, queue_size=1024, flush_interval=64, block=False):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.flush_interval = flush_interval
+        self.block = block
+        self.unflushed_count = 0
+        self.dropped_count = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self.segment = -1
+        self.segment_file = None
+        self.segment_map = None
+        self.position = 0
+        self.index_file = open(os.path.join(directory, INDEX_FILE_NAME), "wb")
+
+        self.frames = queue.Queue(queue_size)
+        self.writer_error = None
+        self.writer_thread = threading.Thread(target=self.write_frames, name="StreamRecorderWriter", daemon=True)
+        self.writer_thread.start()
+
+    # Queue a frame for recording. The payload is copied, since the receive buffer is reused for the next frame.
+    # Returns False when the queue was full and the frame was dropped, unless block is enabled.
+    def record(self, header, payload):
+        if self.writer_error is not None:
+            raise self.writer_error
+        if self.block:
+            if not self.put((header, bytes(payload))):
+                raise self.writer_error or RuntimeError("The recorder is closed")
+            return True
+
+        if not self.writer_thread.is_alive():
+            raise self.writer_error or RuntimeError("The recorder is closed")
+        try:
+            self.frames.put_nowait((header, bytes(payload)))
+            return True
+        except queue.Full:
+            self.dropped_count += 1
+            return False
+
+    # Put an item on the queue, unless the writer thread stopped, e.g. because the disk is full.
+    # Returns False when the writer stopped, in which case nobody would ever take the item from a full queue.
+    def put(self, item):
+        while self.writer_thread.is_alive():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def write_frames(self):
+        try:
+            while True:
+                frame = self.frames.get()
+                if frame is None:
+                    break
+                self.write_frame(*frame)
+        except Exception as error:
+            self.writer_error = error
+
+    def open_segment(self, minimum_size):
+        self.close_segment()
+        self.segment += 1
+        size = max(self.segment_size, minimum_size)
+        self.segment_file = open(os.path.join(self.directory, segment_file_name(self.segment)), "w+b")
+        self.segment_file.truncate(size)
+        self.segment_map = mmap.mmap(self.segment_file.fileno(), size)
+        self.position = 0
+
+    # Close the current segment and trim the part that was preallocated but not used.
+    def close_segment(self):
+        if self.segment_map is None:
+            return
+        self.segment_map.close()
+        self.segment_file.truncate(self.position)
+        self.segment_file.close()
+        self.segment_map = None
+        self.segment_file = None
+
+    def write_frame(self, header, payload):
+        frame_size = HEADER_SIZE + len(payload)
+        if self.segment_map is None or self.position + frame_size > len(self.segment_map):
+            self.open_segment(frame_size)
+
+        offset = self.position
+        header_struct.pack_into(self.segment_map, offset, *header)
+        self.segment_map[offset + HEADER_SIZE:offset + frame_size] = payload
+        self.position += frame_size
+
+        record = np.array([(header.sequence_number, self.segment, offset, header.transmit_timestamp)], dtype=index_dtype)
+        self.index_file.write(record.tobytes())
+        self.unflushed_count += 1
+        if self.unflushed_count >= self.flush_interval:
+            self.index_file.flush()
+            self.unflushed_count = 0
+
+    # Write the frames still in the queue and close the capture.
+    def close(self):
+        self.put(None)
+        self.writer_thread.join()
+        self.close_segment()
+        self.index_file.close()
+        if self.writer_error is not None:
+            raise self.writer_error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CaptureReplay:
+    def __init__(self, directory):
+        self.directory = directory
+        # The index of a capture that was not closed may end in a partly written record, which is ignored.
+        with open(os.path.join(directory, INDEX_FILE_NAME), "rb") as index_file:
+            index_data = index_file.read()
+        self.index = np.frombuffer(index_data[:len(index_data) - len(index_data) % index_dtype.itemsize], dtype=index_dtype)
+        self.segment_maps = {}
+        self.position = 0
+        self.plan_cache = FramePlanCache()
+
+    def __len__(self):
+        return len(self.index)
+
+    # Map a segment on first use; the segment is kept as the mmap and a memoryview on it, which can be sliced without copying.
+    def map_segment(self, segment):
+        segment_map = self.segment_maps.get(segment)
+        if segment_map is None:
+            with open(os.path.join(self.directory, segment_file_name(segment)), "rb") as segment_file:
+                mapped = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+            segment_map = self.segment_maps[segment] = (mapped, memoryview(mapped))
+        return segment_map[1]
+
+    # Continue the replay at the first frame with at least the given SequenceNumber.
+    # The SequenceNumbers increase along the capture, hence a binary search on the index is used.
+    def seek_sequence(self, sequence_number):
+        self.position = int(np.searchsorted(self.index["sequence_number"], sequence_number))
+
+    # Continue the replay at the first frame sent at or after the given TransmitTimestamp.
+    def seek_time(self, transmit_timestamp):
+        self.position = int(np.searchsorted(self.index["transmit_timestamp"], transmit_timestamp))
+
+    # Return the header and payload of a frame, the payload is a memoryview straight into the capture file.
+    def frame_at(self, position):
+        record = self.index[position]
+        segment_map = self.map_segment(int(record["segment"]))
+        offset = int(record["offset"])
+        header = StreamHeader._make(header_struct.unpack_from(segment_map, offset))
+        return header, segment_map[offset + HEADER_SIZE:offset + HEADER_SIZE + header.payload_size]
+
+    # Same as StreamReceiver.read_frame, so a replay can stand in for the socket.
+    # Raises a ConnectionError at the end of the capture, just like a closed connection.
+    def read_frame(self):
+        if self.position >= len(self.index):
+            raise ConnectionError("End of capture")
+        frame = self.frame_at(self.position)
+        self.position += 1
+        return frame
+
+    # Iterate over the raw frames from the current position.
+    # By default the frames are returned as fast as they can be read. With realtime enabled, the replay is paced by the
+    # TransmitTimestamps, optionally sped up or slowed down by the speed factor.
+    def raw_frames(self, realtime=False, speed=1.0):
+        start_time = None
+        first_timestamp = None
+        while self.position < len(self.index):
+            header, payload = self.read_frame()
+            if realtime:
+                if start_time is None:
+                    start_time = time.monotonic()
+                    first_timestamp = header.transmit_timestamp
+                delay = (header.transmit_timestamp - first_timestamp) / speed - (time.monotonic() - start_time)
+                if delay > 0:
+                    time.sleep(delay)
+            yield header, payload
+
+    # Iterate over the decoded data frames from the current position, using the same decoder as the stream client.
+    def frames(self, realtime=False, speed=1.0):
+        for header, payload in self.raw_frames(realtime, speed):
+            if header.payload_type == PAYLOAD_TYPE_DATA:
+                yield self.plan_cache.decode(header, payload)
+
+    def close(self):
+        for mapped, view in self.segment_maps.values():
+            try:
+                view.release()
+                mapped.close()
+            except BufferError:
+                # A payload view is still in use, the mapping is closed once it is garbage collected.
+                pass
+        self.segment_maps = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,169 @@
+# QServer introduction to Python: A stream session which survives connection problems.
+# The StreamData example stops on the first problem, which costs the rest of a measurement. The StreamSession wraps a
+# StreamClient and keeps the stream going:
+# - When the connection drops or stalls, the session requests the streaming port through /datastream/setup/ again and
+#   reconnects, retrying with an exponential backoff. The client is reused, hence the cached frame plan and the store
+#   are kept and decoding continues with the first frame after the reconnect.
+# - Frames are resumed by SequenceNumber: frames which were already delivered are dropped, and the frames missed while
+#   reconnecting show up as a gap in the StreamHealth of the client.
+# - A channel which fails to decode is skipped and counted, the other channels of the frame are still delivered.
+#   Channels of an unknown ChannelType are skipped using their ChannelDataSize.
+# - Payloads which are not data payloads are passed to the registered handlers on a separate thread, so handling
+#   control and status payloads does not hold up the stream.
+#
+# Usage:
+#     with StreamSession("192.168.100.47", store=ChannelStore(capacity=1000000)) as session:
+#         for frame in session.frames():
+#             ...
+
+import queue
+import threading
+import time
+from StreamClient import StreamClient
+
+
+class StreamSession:
+    # The store is optional; every frame is added to it with append_frame, e.g. a ChannelStore or a ChannelExporter.
+    # A connection which receives nothing for the receive timeout in seconds is considered lost. The same timeout
+    # applies to the HTTP requests and the connect of every attempt, so an unreachable controller does not hang the session.
+    # The backoff starts at the initial delay in seconds and is multiplied by the factor after every failed attempt,
+    # up to the maximum delay. With a maximum number of attempts the session gives up by raising the last error.
+    # A SequenceNumber more than the resume window below the last one means QServer restarted its numbering.
+    def __init__(self, ip, port=8080, store=None, channel_filter=None, receive_timeout=5.0, initial_delay=0.1, backoff_factor=2.0,
+                 max_delay=5.0, max_attempts=None, resume_window=1000):
+        self.client = StreamClient(ip, port, channel_filter, receive_timeout)
+        self.client.channel_error_handler = self.channel_error
+        self.client.health.restart_window = resume_window
+        self.store = store
+        self.receive_timeout = receive_timeout
+        self.initial_delay = initial_delay
+        self.backoff_factor = backoff_factor
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.resume_window = resume_window
+
+        self.last_sequence_number = None
+        self.connected = False
+        self.reconnect_count = 0
+        self.duplicate_count = 0
+        self.bad_frame_count = 0
+        self.channel_errors = {}
+        self.last_error = None
+
+        # Called with the session after every reconnect.
+        self.on_reconnect = None
+
+        self.handler_queue = queue.Queue()
+        self.handler_thread = None
+
+    @property
+    def health(self):
+        return self.client.health
+
+    # Register a handler for the payloads of the given PayloadType; it is called with the StreamHeader and a copy of the payload.
+    def register_handler(self, payload_type, handler):
+        def enqueue(header, payload):
+            self.handler_queue.put((handler, header, bytes(payload)))
+        self.client.register_payload_handler(payload_type, enqueue)
+
+        if self.handler_thread is None:
+            self.handler_thread = threading.Thread(target=self.dispatch_payloads, daemon=True)
+            self.handler_thread.start()
+
+    def dispatch_payloads(self):
+        while True:
+            task = self.handler_queue.get()
+            if task is None:
+                return
+            handler, header, payload = task
+            try:
+                handler(header, payload)
+            except Exception as error:
+                self.last_error = error
+
+    def channel_error(self, channel, error):
+        self.channel_errors[channel.channel_id] = self.channel_errors.get(channel.channel_id, 0) + 1
+        self.last_error = error
+
+    # Connect, retrying with an exponential backoff.
+    def connect(self):
+        delay = self.initial_delay
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self.client.connect()
+                self.client.client_socket.settimeout(self.receive_timeout)
+                self.connected = True
+                return
+            except OSError as error:
+                # requests.ConnectionError and socket.timeout are both an OSError.
+                self.client.close()
+                self.last_error = error
+                if self.max_attempts is not None and attempt >= self.max_attempts:
+                    raise
+            time.sleep(delay)
+            delay = min(delay * self.backoff_factor, self.max_delay)
+
+    def reconnect(self):
+        self.client.close()
+        self.connected = False
+        self.connect()
+        self.reconnect_count += 1
+        if self.on_reconnect is not None:
+            self.on_reconnect(self)
+
+    # Read the next data frame which was not delivered before, reconnecting when needed.
+    def read_frame(self):
+        if not self.connected:
+            self.connect()
+        while True:
+            try:
+                frame = self.client.read_frame()
+            except OSError as error:
+                # The StreamReceiver raises a ConnectionError when QServer closes the connection.
+                self.last_error = error
+                self.reconnect()
+                continue
+            except ValueError as error:
+                # An unknown byte order marker or a payload whose channel blocks do not add up; the frame is skipped.
+                self.last_error = error
+                self.bad_frame_count += 1
+                continue
+            if frame is None:
+                continue
+
+            sequence_number = frame.header.sequence_number
+            last = self.last_sequence_number
+            # A SequenceNumber far below the last one means the numbering restarted, e.g. because QServer was restarted;
+            # the StreamHealth counts the restart and this frame is delivered.
+            if last is not None and last - self.resume_window < sequence_number <= last:
+                self.duplicate_count += 1
+                continue
+            self.last_sequence_number = sequence_number
+
+            if self.store is not None:
+                self.store.append_frame(frame)
+            return frame
+
+    # Iterate over the data frames, optionally stopping after the given number of frames.
+    def frames(self, count=None):
+        received = 0
+        while count is None or received < count:
+            yield self.read_frame()
+            received += 1
+
+    def close(self):
+        self.client.close()
+        self.connected = False
+        if self.handler_thread is not None:
+            self.handler_queue.put(None)
+            self.handler_thread.join()
+            self.handler_thread = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()